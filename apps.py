@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class BackContentConfig(AppConfig):
+    name = 'plugins.back_content'
+    label = 'back_content'
+    default_auto_field = 'django.db.models.AutoField'
+
+    def ready(self):
+        from plugins.back_content import signals  # noqa: F401
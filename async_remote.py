@@ -0,0 +1,191 @@
+import asyncio
+import functools
+import time
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+
+from plugins.back_content import metrics, remote
+
+
+ASYNC_FETCH_CONCURRENCY = getattr(
+    settings,
+    'BACK_CONTENT_ASYNC_FETCH_CONCURRENCY',
+    32,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def get_httpx():
+    """
+    Imports httpx on first use.
+    :return: the httpx module, or None when it isn't installed
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+    return httpx
+
+
+def get_client():
+    """
+    Returns an httpx AsyncClient with the same timeouts as the sync client.
+    Only call when httpx is installed.
+    """
+    httpx = get_httpx()
+    if isinstance(remote.HTTP_TIMEOUT, (tuple, list)):
+        connect, read = remote.HTTP_TIMEOUT
+    else:
+        connect = read = remote.HTTP_TIMEOUT
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(read, connect=connect),
+        limits=httpx.Limits(
+            max_connections=ASYNC_FETCH_CONCURRENCY,
+            max_keepalive_connections=ASYNC_FETCH_CONCURRENCY,
+        ),
+        follow_redirects=True,
+    )
+
+
+async def wait_for_token(url):
+    bucket = remote.rate_limiter.bucket(url)
+    delay = bucket.take()
+    while delay:
+        await asyncio.sleep(delay)
+        delay = bucket.take()
+
+
+async def read_until(r, marker):
+    """
+    Async version of remote.read_until for an httpx streamed response.
+    """
+    data = bytearray()
+    async for chunk in r.aiter_bytes():
+        search_from = max(0, len(data) - len(marker))
+        data.extend(chunk)
+        if bytes(data[search_from:]).lower().find(marker) != -1:
+            break
+    return data.decode(r.encoding or 'utf-8', errors='replace')
+
+
+async def fetch(client, url, headers=None, stream_until=None):
+    """
+    GETs a URL with httpx, following the same rate limits, retries and
+    backoff as remote.fetch. The body is read before returning.
+    :param client: httpx.AsyncClient
+    :param url: URL to fetch
+    :param headers: dict of request headers
+    :param stream_until: lower-case bytes marker to stop reading after
+    :return: remote.CachedResponse
+    """
+    httpx = get_httpx()
+    attempt = 0
+    while True:
+        await wait_for_token(url)
+        try:
+            async with client.stream('GET', url, headers=headers) as r:
+                remote.rate_limiter.update(url, r)
+                if r.status_code not in remote.RETRY_STATUSES or attempt >= remote.HTTP_RETRIES:
+                    if r.status_code == 304:
+                        text = ''
+                    elif stream_until:
+                        text = await read_until(r, stream_until)
+                    else:
+                        await r.aread()
+                        text = r.text
+                    return remote.CachedResponse(
+                        str(r.url),
+                        r.status_code,
+                        text,
+                        {
+                            name: r.headers[name] for name in remote.CACHED_HEADERS
+                            if name in r.headers
+                        },
+                    )
+                delay = max(remote.backoff(attempt), remote.retry_after(r) or 0)
+        except httpx.TransportError:
+            if attempt >= remote.HTTP_RETRIES:
+                raise
+            delay = remote.backoff(attempt)
+
+        delay = min(delay, remote.HTTP_BACKOFF_MAX)
+        metrics.record('http.retry', seconds=delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def cached_get(client, url, key=None, stream_until=None):
+    """
+    Async version of remote.cached_get, sharing its response cache. Cache
+    reads and writes are file I/O, so they run in worker threads rather
+    than on the event loop.
+    """
+    key = key or url
+    entry, cached, headers = await sync_to_async(
+        remote.cache_lookup,
+        thread_sensitive=False,
+    )(key)
+    if cached:
+        return cached
+
+    start = time.perf_counter()
+    response = await fetch(client, url, headers=headers, stream_until=stream_until)
+    if entry and response.status_code == 304:
+        return await sync_to_async(
+            remote.cache_revalidated,
+            thread_sensitive=False,
+        )(key, entry, start)
+    return await sync_to_async(
+        remote.cache_store,
+        thread_sensitive=False,
+    )(key, response, start)
+
+
+async def fetch_crossref_work(client, doi):
+    r = await cached_get(
+        client,
+        remote.crossref_work_url(doi),
+        key=remote.crossref_cache_key(doi),
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+async def fetch_url(client, url):
+    r = await cached_get(client, url, stream_until=b'</head>')
+    r.raise_for_status()
+    return r
+
+
+async def gather_fetches(fetcher, keys, concurrency=None):
+    """
+    Runs fetcher(client, key) for each key concurrently. Uses httpx when it
+    is installed, otherwise the sync fetcher of the same name in remote runs
+    in a thread per fetch.
+    :param fetcher: fetch_crossref_work or fetch_url
+    :param keys: list of DOIs or URLs
+    :param concurrency: max fetches in flight
+    :return: list of (key, result, error) tuples in input order
+    """
+    semaphore = asyncio.Semaphore(concurrency or ASYNC_FETCH_CONCURRENCY)
+    sync_fetcher = sync_to_async(
+        getattr(remote, fetcher.__name__),
+        thread_sensitive=False,
+    )
+
+    async def _fetch(client, key):
+        async with semaphore:
+            try:
+                if client:
+                    return key, await fetcher(client, key), None
+                return key, await sync_fetcher(key), None
+            except Exception as e:
+                return key, None, e
+
+    if get_httpx() is None:
+        return await asyncio.gather(*[_fetch(None, key) for key in keys])
+
+    async with get_client() as client:
+        return await asyncio.gather(*[_fetch(client, key) for key in keys])
@@ -0,0 +1,681 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import shutil
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+
+from plugins.back_content import parsers
+
+
+def summarise(timings):
+    """
+    Summarises a list of timings in seconds.
+    :param timings: list of floats
+    :return: dict of n, mean, p50 and p95 in milliseconds
+    """
+    ordered = sorted(timings)
+    return {
+        'n': len(ordered),
+        'mean': statistics.mean(ordered) * 1000,
+        'p50': ordered[int(0.50 * (len(ordered) - 1))] * 1000,
+        'p95': ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+    }
+
+
+def measure(func, args_list, repeat=1):
+    """
+    Calls func once per args tuple, repeat times, recording wall time and
+    the peak traced memory of the slowest call.
+    :return: dict of timing summary plus peak_kb
+    """
+    timings = []
+    peak = 0
+    for _i in range(repeat):
+        for args in args_list:
+            tracemalloc.start()
+            start = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - start)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    summary = summarise(timings)
+    summary['peak_kb'] = peak / 1024
+    return summary
+
+
+def synthetic_landing_page(body_kb=2048):
+    """
+    Builds a landing page with the usual citation meta tags followed by a
+    large body, similar in shape to a publisher article page.
+    """
+    head = (
+        '<!DOCTYPE html><html><head><title>Article</title>'
+        '<meta name="citation_title" content="A Synthetic Article">'
+        '<meta name="citation_date" content="2020/01/15">'
+        '<meta name="citation_doi" content="10.1234/synthetic.1">'
+        '<meta name="citation_language" content="en">'
+        '<meta name="description" content="An abstract.">'
+        + ''.join(
+            '<meta name="citation_author" content="Author {0}">'.format(i)
+            for i in range(50)
+        )
+        + '</head>'
+    )
+    paragraph = '<p>{0}</p>'.format('Lorem ipsum dolor sit amet. ' * 36)
+    body = '<body>{0}</body></html>'.format(
+        paragraph * (body_kb * 1024 // len(paragraph)),
+    )
+    return head + body
+
+
+def _soup_extract(text):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(text, 'lxml')
+    return [
+        soup.find('meta', {'name': name}).get('content', '')
+        for name in (
+            'citation_title',
+            'citation_date',
+            'citation_doi',
+            'citation_language',
+            'description',
+        )
+    ]
+
+
+def _chunked(text, chunk_size=16 * 1024):
+    for i in range(0, len(text), chunk_size):
+        yield text[i:i + chunk_size]
+
+
+def _stream_extract(text):
+    return parsers.extract_citation_meta(_chunked(text))
+
+
+def bench_meta_extraction(pages, repeat=5):
+    """
+    Compares the streaming meta extractor with the BeautifulSoup approach it
+    replaced on a list of landing pages.
+    :param pages: list of HTML strings
+    :param repeat: number of passes over the pages
+    :return: dict of implementation name to measurement
+    """
+    args_list = [(page,) for page in pages]
+    results = {
+        'streaming': measure(_stream_extract, args_list, repeat),
+    }
+    try:
+        import bs4  # noqa: F401
+        import lxml  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        results['beautifulsoup'] = measure(_soup_extract, args_list, repeat)
+    return results
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed_accounts(count, batch_size=5000):
+    """
+    Bulk creates accounts with random names for benchmarking.
+    :param count: number of accounts
+    :return: list of last names used, to search for
+    """
+    from core.models import Account
+
+    rng = random.Random(count)
+    last_names = []
+    for i in range(0, count, batch_size):
+        accounts = []
+        for _j in range(min(batch_size, count - i)):
+            email = '{0}@journal.com'.format(uuid.uuid4())
+            last_name = ''.join(rng.choice(string.ascii_lowercase) for _k in range(8)).title()
+            last_names.append(last_name)
+            accounts.append(
+                Account(
+                    email=email,
+                    username=email,
+                    first_name=rng.choice(('Ada', 'Alan', 'Grace', 'Edsger', 'Barbara')),
+                    last_name=last_name,
+                )
+            )
+        Account.objects.bulk_create(accounts, batch_size=batch_size)
+    return last_names
+
+
+def bench_author_search(article, count=100000, searches=20, repeat=3):
+    """
+    Compares the author search against the previous pk__in exclusion and
+    full queryset membership check on a seeded accounts table. Everything
+    is rolled back afterwards.
+    :param article: Article object to search authors for
+    :param count: number of accounts to seed
+    :param searches: number of search terms to try
+    :return: dict of implementation name to measurement
+    """
+    from core.models import Account
+    from plugins.back_content import logic
+
+    results = {}
+    try:
+        with transaction.atomic():
+            last_names = seed_accounts(count)
+            terms = random.Random(searches).sample(last_names, searches)
+            args_list = [(term[:5],) for term in terms]
+
+            def indexed(term):
+                accounts = logic.available_authors(Account.objects.all(), article, term)
+                page = list(accounts.order_by('last_name')[:25])
+                if page:
+                    accounts.filter(pk=page[0].pk).exists()
+
+            def previous(term):
+                accounts = Account.objects.filter(
+                    last_name__icontains=term,
+                ).exclude(
+                    pk__in=article.authors.all().values_list('pk', flat=True),
+                )
+                page = list(accounts.order_by('last_name')[:25])
+                if page:
+                    page[0] in accounts
+
+            results['previous'] = measure(previous, args_list, repeat)
+            results['indexed'] = measure(indexed, args_list, repeat)
+            raise Rollback
+    except Rollback:
+        pass
+    return results
+
+
+def measure_operation(func, args_list):
+    """
+    Calls func once per args tuple, recording wall time and query count.
+    :return: dict of timing summary, throughput and query counts
+    """
+    from plugins.back_content.metrics import QueryCounter
+
+    timings = []
+    queries = []
+    start = time.perf_counter()
+    for args in args_list:
+        with QueryCounter() as counter:
+            call_start = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - call_start)
+        queries.append(counter.count)
+    elapsed = time.perf_counter() - start
+
+    summary = summarise(timings)
+    summary['throughput'] = len(timings) / elapsed if elapsed else 0
+    summary['queries'] = statistics.mean(queries)
+    summary['max_queries'] = max(queries)
+    return summary
+
+
+def synthetic_crossref_record(doi, authors=5):
+    """
+    Builds a Crossref works response for a DOI.
+    """
+    return {
+        'status': 'ok',
+        'message-type': 'work',
+        'message': {
+            'DOI': doi,
+            'title': ['Benchmark article {0}'.format(doi)],
+            'abstract': '<jats:p>An abstract.</jats:p>',
+            'published-online': {'date-parts': [[2020, 1, 15]]},
+            'author': [
+                {
+                    'given': 'Given{0}'.format(i),
+                    'family': 'Family{0}'.format(i),
+                    'affiliation': [{'name': 'University {0}'.format(i % 3)}],
+                } for i in range(authors)
+            ],
+        },
+    }
+
+
+def load_crossref_fixtures(directory):
+    """
+    Loads recorded Crossref responses, one JSON file per DOI.
+    :param directory: path to a directory of .json files
+    :return: dict of DOI to response
+    """
+    records = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name), encoding='utf-8') as fixture:
+                record = json.load(fixture)
+            records[record['message']['DOI']] = record
+    return records
+
+
+class StubServer(object):
+    """
+    A local HTTP server standing in for Crossref and publisher landing
+    pages. Works are served from /works/<doi> and pages from /pages/<n>.
+    """
+    def __init__(self, records, pages):
+        self.records = records
+        self.pages = pages
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/works/'):
+                    record = stub.records.get(self.path[len('/works/'):])
+                    body = json.dumps(record).encode('utf-8') if record else None
+                    content_type = 'application/json'
+                elif self.path.startswith('/pages/'):
+                    index = self.path[len('/pages/'):]
+                    body = None
+                    if index.isdigit() and int(index) < len(stub.pages):
+                        body = stub.pages[int(index)].encode('utf-8')
+                    content_type = 'text/html; charset=utf-8'
+                else:
+                    body = None
+
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def get_benchmark_issue(journal):
+    from journal.models import Issue, IssueType
+
+    issue = journal.issue_set.first()
+    if issue:
+        return issue
+    issue_type, _created = IssueType.objects.get_or_create(
+        journal=journal,
+        code='issue',
+        defaults={'pretty_name': 'Issue'},
+    )
+    return Issue.objects.create(
+        journal=journal,
+        volume=1,
+        issue='1',
+        issue_title='Benchmark Issue',
+        issue_type=issue_type,
+    )
+
+
+def create_benchmark_journal():
+    """
+    Creates a throwaway journal for the import suite with Janeway's test
+    helpers, adding a press when the database has none. Call inside a
+    transaction that is rolled back.
+    :return: Journal object
+    """
+    from press.models import Press
+    from utils.testing import helpers
+
+    if not Press.objects.exists():
+        helpers.create_press()
+    journal, _journal_two = helpers.create_journals()
+    return journal
+
+
+def create_benchmark_owner():
+    from core.models import Account
+
+    return Account.objects.create(
+        username='back-content-benchmark@example.org',
+        email='back-content-benchmark@example.org',
+        first_name='Benchmark',
+        last_name='Owner',
+        is_active=True,
+        is_staff=True,
+        is_superuser=True,
+    )
+
+
+def bench_import_pipeline(journal=None, count=50, records=None, pages=None):
+    """
+    Replays DOI imports against a local stub Crossref server, imports saved
+    landing pages, uploads a synthetic galley to each article and publishes
+    them. Runs in a transaction that is rolled back, with a throwaway owner
+    and, unless one is given, a throwaway journal, and the uploaded files
+    are deleted afterwards.
+    :param journal: Journal object to import into, defaults to a new one
+    :param count: number of DOIs to import when records aren't given
+    :param records: dict of DOI to recorded Crossref response
+    :param pages: list of landing page HTML strings
+    :return: dict of operation name to measurement
+    """
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import RequestFactory
+
+    from plugins.back_content import logic, remote, uploads
+
+    if not records:
+        records = {
+            '10.9999/benchmark.{0}'.format(i): synthetic_crossref_record(
+                '10.9999/benchmark.{0}'.format(i),
+            ) for i in range(count)
+        }
+    pages = pages or [synthetic_landing_page(body_kb=256) for _i in range(10)]
+
+    request = RequestFactory().post('/')
+    request._messages = _NullMessages()
+
+    results = {}
+    articles = []
+    cache_dir = tempfile.mkdtemp()
+    crossref_api = remote.CROSSREF_API
+    response_cache = remote.response_cache
+    rate_limiter = remote.rate_limiter
+
+    def import_doi(doi):
+        record = remote.fetch_crossref_work(doi)
+        articles.append(
+            logic.get_and_parse_doi_metadata(record, None, doi, journal=request.journal),
+        )
+
+    def import_page(url):
+        articles.append(
+            logic.parse_url_results(remote.fetch_url(url), None, journal=request.journal),
+        )
+
+    def upload_galley(article):
+        uploads.save_uploads(
+            article,
+            request,
+            [SimpleUploadedFile('article.pdf', b'%PDF-1.4\n' + b'0' * 64 * 1024, 'application/pdf')],
+        )
+
+    def publish(article):
+        article.date_published = article.date_published or article.date_started
+        logic.bulk_publish([article], request, issue=issue, raise_events=False)
+
+    try:
+        with StubServer(records, pages) as stub, transaction.atomic():
+            remote.CROSSREF_API = stub.url
+            remote.response_cache = remote.ResponseCache(
+                cache_dir,
+                remote.HTTP_CACHE_TTL,
+                remote.HTTP_CACHE_MAX_BYTES,
+            )
+            # The stub is local, so don't let the per-host limit set the pace.
+            remote.rate_limiter = remote.RateLimiter(10 ** 6)
+            request.journal = journal or create_benchmark_journal()
+            request.user = create_benchmark_owner()
+            request.site_type = request.journal
+            request.press = request.journal.press
+            issue = get_benchmark_issue(request.journal)
+
+            results['doi_import'] = measure_operation(
+                import_doi,
+                [(doi,) for doi in records],
+            )
+            results['landing_page_import'] = measure_operation(
+                import_page,
+                [('{0}/pages/{1}'.format(stub.url, i),) for i in range(len(pages))],
+            )
+            results['galley_upload'] = measure_operation(
+                upload_galley,
+                [(article,) for article in articles],
+            )
+            results['publish'] = measure_operation(
+                publish,
+                [(article,) for article in articles],
+            )
+            raise Rollback
+    except Rollback:
+        pass
+    finally:
+        remote.CROSSREF_API = crossref_api
+        remote.response_cache = response_cache
+        remote.rate_limiter = rate_limiter
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        for article in articles:
+            shutil.rmtree(
+                os.path.join(settings.BASE_DIR, 'files', 'articles', str(article.pk)),
+                ignore_errors=True,
+            )
+    return results
+
+
+class _NullMessages(object):
+    def add(self, *args, **kwargs):
+        pass
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25):
+    """
+    Compares results with a stored baseline.
+    :param results: dict of operation name to measurement
+    :param baseline: dict in the same shape
+    :param tolerance: allowed fractional increase in p95 latency and
+    queries, and decrease in throughput
+    :return: list of regression descriptions
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result['p95'] > base['p95'] * (1 + tolerance):
+            regressions.append(
+                '{0}: p95 {1:.2f}ms vs baseline {2:.2f}ms'.format(name, result['p95'], base['p95'])
+            )
+        if 'throughput' in base and result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(
+                '{0}: throughput {1:.2f}/s vs baseline {2:.2f}/s'.format(
+                    name, result['throughput'], base['throughput'],
+                )
+            )
+        if 'queries' in base and result['queries'] > base['queries'] * (1 + tolerance):
+            regressions.append(
+                '{0}: {1:.1f} queries vs baseline {2:.1f}'.format(
+                    name, result['queries'], base['queries'],
+                )
+            )
+    return regressions
+
+
+# The most the plugin should add to startup, the default for --max-ms.
+STARTUP_MAX_MS = 50
+# Modules the plugin should only import when an import or preview runs.
+DEFERRED_MODULES = (
+    'requests',
+    'httpx',
+    'bs4',
+    'lxml',
+    'production.logic',
+    'journal.logic',
+    'identifiers.logic',
+    'events.logic',
+    'review.logic',
+)
+# Janeway modules the plugin's views build on, which Janeway's own URLs
+# import anyway. They are imported before the plugin is measured.
+JANEWAY_MODULES = (
+    'core.models',
+    'core.views',
+    'core.model_utils',
+    'submission.models',
+    'submission.forms',
+    'submission.logic',
+    'production.forms',
+    'security.decorators',
+    'journal.views',
+    'utils.forms',
+)
+IMPORT_MARKER = 'back_content: measuring plugin imports'
+# Prefixes the lines the import script writes for each module the plugin's
+# own modules import while they load.
+PLUGIN_IMPORT_PREFIX = 'back_content imports: '
+IMPORT_SCRIPT = """
+import builtins
+import importlib
+import sys
+
+_import = builtins.__import__
+
+
+def record_import(name, globals=None, locals=None, fromlist=(), level=0):
+    importer = (globals or {{}}).get('__name__') or ''
+    if importer.startswith('plugins.back_content') and not level:
+        for module in [name] + ['.'.join((name, item)) for item in fromlist or ()]:
+            sys.stderr.write({prefix!r} + importer + ' ' + module + '\\n')
+    return _import(name, globals, locals, fromlist, level)
+
+
+builtins.__import__ = record_import
+
+import django
+
+django.setup()
+for name in {modules!r}:
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        pass
+sys.stderr.write({marker!r} + '\\n')
+import plugins.back_content.urls
+"""
+
+
+def parse_importtime(output):
+    """
+    Parses the output of python -X importtime.
+    :param output: stderr of the process
+    :return: tuple of (module, self microseconds) lists from before and
+    after IMPORT_MARKER
+    """
+    before, after = [], []
+    current = before
+    for line in output.splitlines():
+        if line.strip() == IMPORT_MARKER:
+            current = after
+            continue
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        current.append((parts[2].strip(), int(parts[0])))
+    return before, after
+
+
+def parse_plugin_imports(output):
+    """
+    Reads the imports the plugin's modules made while loading. Imports
+    inside functions only run when the function is called, so they are not
+    included.
+    :param output: stderr of the import script
+    :return: list of (importing module, imported module) tuples
+    """
+    imports = []
+    for line in output.splitlines():
+        if line.startswith(PLUGIN_IMPORT_PREFIX):
+            importer, _space, module = line[len(PLUGIN_IMPORT_PREFIX):].partition(' ')
+            imports.append((importer, module.strip()))
+    return imports
+
+
+def is_deferred(module):
+    return any(
+        module == name or module.startswith(name + '.')
+        for name in DEFERRED_MODULES
+    )
+
+
+def measure_import_time():
+    """
+    Starts a fresh Python process with -X importtime, sets Django up and
+    imports the Janeway modules the plugin depends on, then imports the
+    plugin's URLs as Janeway does when resolving a request. Deferred
+    modules are found from the import statements the plugin's own modules
+    run while loading, so they are caught even when Janeway has already
+    imported them.
+    :return: dict of startup_ms, the time spent in the plugin's own modules
+    during setup plus everything imported through its URLs, the deferred
+    modules the plugin imported and the slowest imports
+    """
+    result = subprocess.run(
+        [
+            sys.executable,
+            '-X',
+            'importtime',
+            '-c',
+            IMPORT_SCRIPT.format(
+                modules=JANEWAY_MODULES,
+                marker=IMPORT_MARKER,
+                prefix=PLUGIN_IMPORT_PREFIX,
+            ),
+        ],
+        cwd=settings.BASE_DIR,
+        env=dict(os.environ),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    before, after = parse_importtime(result.stderr)
+    plugin_setup = [
+        (name, us) for name, us in before
+        if name.startswith('plugins.back_content')
+    ]
+    deferred = []
+    for importer, module in parse_plugin_imports(result.stderr):
+        entry = '{0} (from {1})'.format(module, importer)
+        if is_deferred(module) and entry not in deferred:
+            deferred.append(entry)
+    return {
+        'startup_ms': sum(us for _name, us in plugin_setup + after) / 1000,
+        'modules': len(plugin_setup) + len(after),
+        'deferred': deferred,
+        'slowest': sorted(after, key=lambda item: item[1], reverse=True)[:5],
+    }
+
+
+def bench_import_time(repeat=5):
+    """
+    Measures the plugin's import time in several fresh processes.
+    :return: dict of the median startup_ms and the last run's details
+    """
+    runs = [measure_import_time() for _i in range(repeat)]
+    result = dict(runs[-1])
+    result['startup_ms'] = statistics.median(run['startup_ms'] for run in runs)
+    return result
@@ -1,14 +1,19 @@
+import zipfile
+
 from django import forms
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse_lazy
 from django.utils.text import format_lazy
 
-from submission.models import Article, Licence, Section, FieldAnswer, Field
-from review.logic import render_choices
+from submission.models import (Article, Licence, Section, FieldAnswer, Field,
+                               CreditRecord, STAGE_PUBLISHED)
+from submission.forms import CreditRecordForm
 from utils.forms import KeywordModelForm
 from core.models import Account
 from core.model_utils import DateTimePickerInput
 
+from plugins.back_content import journal_cache, logic
+
 
 class DepositAgreementForm(forms.Form):
     deposit_agreement = forms.BooleanField(
@@ -44,6 +49,10 @@ class PublicationInfo(forms.ModelForm):
         if 'instance' in kwargs:
             article = kwargs['instance']
             self.fields['primary_issue'].queryset = article.journal.issue_set.all()
+            journal_cache.use_cached_choices(
+                self.fields['primary_issue'],
+                journal_cache.get_journal_config(article.journal)['issues'],
+            )
             self.fields['render_galley'].queryset = article.galley_set.all()
 
 
@@ -56,6 +65,111 @@ class RemoteArticle(forms.ModelForm):
 class RemoteParse(forms.Form):
     url = forms.CharField(required=True, label="Enter a URL or a DOI.")
     mode = forms.ChoiceField(required=True, choices=(('url', 'URL'), ('doi', 'DOI')))
+    background = forms.BooleanField(
+        required=False,
+        label="Run in the background",
+    )
+
+class BatchDOIImport(forms.Form):
+    dois = forms.CharField(
+        required=False,
+        widget=forms.Textarea,
+        label="DOIs",
+        help_text="One DOI per line.",
+    )
+    doi_file = forms.FileField(
+        required=False,
+        label="DOI file",
+        help_text="A plain text or CSV file with one DOI per line.",
+    )
+    background = forms.BooleanField(
+        required=False,
+        label="Run in the background",
+        help_text="Recommended for large batches.",
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        text = cleaned_data.get('dois', '')
+        doi_file = cleaned_data.get('doi_file')
+        if doi_file:
+            text = '{0}\n{1}'.format(
+                text,
+                doi_file.read().decode('utf-8-sig', errors='ignore'),
+            )
+        dois = logic.parse_doi_list(text)
+        if not dois:
+            raise forms.ValidationError('Enter at least one DOI.')
+        cleaned_data['doi_list'] = dois
+        return cleaned_data
+
+
+class BulkPublish(forms.Form):
+    articles = forms.ModelMultipleChoiceField(
+        queryset=Article.objects.none(),
+        required=False,
+    )
+    issue = forms.ModelChoiceField(
+        queryset=None,
+        required=False,
+        help_text="With no articles selected, every unpublished article in "
+                  "this issue is published. With articles selected, they "
+                  "are added to this issue before publication.",
+    )
+
+    def __init__(self, *args, **kwargs):
+        journal = kwargs.pop('journal')
+        super(BulkPublish, self).__init__(*args, **kwargs)
+        self.fields['articles'].queryset = Article.objects.filter(
+            journal=journal,
+        ).exclude(
+            stage=STAGE_PUBLISHED,
+        )
+        self.fields['issue'].queryset = journal.issue_set.all()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('articles') and not cleaned_data.get('issue'):
+            raise forms.ValidationError('Select some articles or an issue.')
+        return cleaned_data
+
+    def get_articles(self):
+        articles = self.cleaned_data.get('articles')
+        if not articles:
+            articles = self.fields['articles'].queryset.filter(
+                primary_issue=self.cleaned_data['issue'],
+            )
+            return list(articles.select_related('primary_issue')), None
+        return list(articles.select_related('primary_issue')), self.cleaned_data.get('issue')
+
+
+class ZipImport(forms.Form):
+    archive = forms.FileField(
+        help_text="A ZIP file with one folder per article. Folders are named "
+                  "after the article ID or its DOI with the / replaced by "
+                  "an _, eg. 10.1234_abcd.56.",
+    )
+    label = forms.CharField(
+        required=False,
+        help_text="Optional label for the uploaded galleys and files.",
+    )
+
+    def clean_archive(self):
+        archive = self.cleaned_data['archive']
+        if not zipfile.is_zipfile(archive):
+            raise forms.ValidationError('This file is not a ZIP archive.')
+        archive.seek(0)
+        return archive
+
+
+class SpreadsheetImport(forms.Form):
+    spreadsheet = forms.FileField(
+        help_text="A CSV or TSV file with a header row. Columns are named "
+                  "after the article fields (title, subtitle, abstract, "
+                  "language, section, license, page_numbers, keywords, doi) "
+                  "and any additional submission fields.",
+    )
+
 
 class ArticleInfo(KeywordModelForm):
 
@@ -87,50 +201,67 @@ class ArticleInfo(KeywordModelForm):
 
         super(ArticleInfo, self).__init__(*args, **kwargs)
         if journal:
+            config = journal_cache.get_journal_config(journal)
             self.fields['section'].queryset = Section.objects.filter(
                 journal=journal,
             )
+            journal_cache.use_cached_choices(
+                self.fields['section'],
+                config['sections'],
+            )
             self.fields['section'].required = True
             self.fields['license'].queryset = Licence.objects.filter(
                 journal=journal,
                 available_for_submission=True,
             )
+            journal_cache.use_cached_choices(
+                self.fields['license'],
+                config['licences'],
+            )
             self.fields['license'].required = True
 
-            abstracts_required = journal.get_setting(
-                'general',
-                'abstract_required',
-            )
-            if abstracts_required:
+            if config['abstract_required']:
                 self.fields['abstract'].required = True
 
-            if not journal.submissionconfiguration.subtitle:
+            configuration = config['configuration']
+            if not configuration.subtitle:
                 self.fields.pop('subtitle')
 
-            if not journal.submissionconfiguration.abstract:
+            if not configuration.abstract:
                 self.fields.pop('abstract')
 
-            if not journal.submissionconfiguration.language:
+            if not configuration.language:
                 self.fields.pop('language')
             else:
-                self.fields['language'].initial = journal.submissionconfiguration.default_language
+                self.fields['language'].initial = configuration.default_language
 
-            if not journal.submissionconfiguration.license:
+            if not configuration.license:
                 self.fields.pop('license')
             else:
-                self.fields['license'].initial = journal.submissionconfiguration.default_license
+                self.fields['license'].initial = configuration.default_license_id
 
-            if not journal.submissionconfiguration.keywords:
+            if not configuration.keywords:
                 self.fields.pop('keywords')
 
-            if not journal.submissionconfiguration.section:
+            if not configuration.section:
                 self.fields.pop('section')
             else:
-                self.fields['section'].initial = journal.submissionconfiguration.default_section
+                self.fields['section'].initial = configuration.default_section_id
 
         if submission_summary:
             self.fields['non_specialist_summary'].required = True
 
+        self.additional_fields = elements
+        answers = {}
+        if elements and article:
+            answers = {
+                answer.field_id: answer.answer
+                for answer in FieldAnswer.objects.filter(
+                    field__in=elements,
+                    article=article,
+                )
+            }
+
         if elements:
             for element in elements:
                 if element.kind == 'text':
@@ -146,6 +277,8 @@ class ArticleInfo(KeywordModelForm):
                         required=element.required)
 
                 elif element.kind == 'select':
+                    from review.logic import render_choices
+
                     choices = render_choices(element.choices)
                     self.fields[element.name] = forms.ChoiceField(
                         widget=forms.Select(attrs={'div_class': element.width}), choices=choices,
@@ -163,34 +296,73 @@ class ArticleInfo(KeywordModelForm):
                 self.fields[element.name].help_text = element.help_text
                 self.fields[element.name].label = element.name
 
-                if article:
-                    try:
-                        check_for_answer = FieldAnswer.objects.get(field=element, article=article)
-                        self.fields[element.name].initial = check_for_answer.answer
-                    except FieldAnswer.DoesNotExist:
-                        pass
+                if element.pk in answers:
+                    self.fields[element.name].initial = answers[element.pk]
 
     def save(self, commit=True, request=None):
         article = super(ArticleInfo, self).save(commit=commit)
 
         if request:
-            additional_fields = Field.objects.filter(journal=request.journal)
-
+            additional_fields = self.additional_fields
+            if additional_fields is None:
+                additional_fields = Field.objects.filter(journal=request.journal)
+
+            existing = {
+                answer.field_id: answer
+                for answer in FieldAnswer.objects.filter(
+                    article=article,
+                    field__in=additional_fields,
+                )
+            }
+            to_create = []
+            to_update = []
             for field in additional_fields:
                 answer = request.POST.get(field.name, None)
                 if answer:
-                    try:
-                        field_answer = FieldAnswer.objects.get(article=article, field=field)
-                        field_answer.answer = answer
-                        field_answer.save()
-                    except FieldAnswer.DoesNotExist:
-                        field_answer = FieldAnswer.objects.create(article=article, field=field, answer=answer)
+                    if field.pk in existing:
+                        field_answer = existing[field.pk]
+                        if field_answer.answer != answer:
+                            field_answer.answer = answer
+                            to_update.append(field_answer)
+                    else:
+                        to_create.append(
+                            FieldAnswer(article=article, field=field, answer=answer)
+                        )
+
+            if to_create:
+                FieldAnswer.objects.bulk_create(to_create)
+            if to_update:
+                FieldAnswer.objects.bulk_update(to_update, ['answer'])
 
             request.journal.submissionconfiguration.handle_defaults(article)
 
         return article
 
 
+def credit_forms(authors_and_credits):
+    """
+    Builds Janeway's credit form for each author from records that were
+    already loaded, so no queries run per author. Forms are unprefixed, as
+    they are when Janeway builds them, and roles the author already has
+    are left out of the choices.
+    :param authors_and_credits: dict from logic.load_authors_and_credits
+    :return: list of (FrozenAuthor, list of CreditRecords, form) tuples
+    """
+    authors = []
+    for author, credits in authors_and_credits.items():
+        credit_form = CreditRecordForm(
+            instance=CreditRecord(frozen_author=author),
+        )
+        if 'role' in credit_form.fields:
+            assigned = {record.role for record in credits}
+            credit_form.fields['role'].choices = [
+                (value, label) for value, label in credit_form.fields['role'].choices
+                if value not in assigned
+            ]
+        authors.append((author, credits, credit_form))
+    return authors
+
+
 class ExistingAuthor(forms.Form):
     author = forms.ModelChoiceField(
         queryset=Account.objects.all()
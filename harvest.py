@@ -0,0 +1,149 @@
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from plugins.back_content import logic, models, remote
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+HARVEST_MAX_ATTEMPTS = getattr(settings, 'BACK_CONTENT_HARVEST_MAX_ATTEMPTS', 3)
+
+
+def deposited(item):
+    """
+    Reads the date a Crossref work was last updated.
+    :return: aware datetime or None
+    """
+    value = (item.get('deposited') or {}).get('date-time')
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def record_results(state, results):
+    """
+    Adds failed imports to a harvest state's failed DOIs, counting an
+    attempt for each, and removes DOIs that have now been imported.
+    :param state: HarvestState object
+    :param results: list of result dicts from logic.save_doi_records or
+    logic.import_dois
+    """
+    for result in results:
+        if result['error']:
+            failure = state.failed_dois.setdefault(result['doi'], {'attempts': 0})
+            failure['attempts'] += 1
+            failure['error'] = result['error']
+            logger.warning(
+                'Harvest of {0} could not import {1}: {2}'.format(
+                    state.issn,
+                    result['doi'],
+                    result['error'],
+                )
+            )
+        else:
+            state.failed_dois.pop(result['doi'], None)
+
+
+def retry_failures(state, journal, author_index, doi_index):
+    """
+    Fetches and imports the DOIs earlier runs failed on again, up to
+    HARVEST_MAX_ATTEMPTS attempts each.
+    :return: number of DOIs imported
+    """
+    dois = [
+        doi for doi, failure in state.failed_dois.items()
+        if failure['attempts'] < HARVEST_MAX_ATTEMPTS
+    ]
+    if not dois:
+        return 0
+    results = logic.import_dois(
+        dois,
+        journal,
+        author_index=author_index,
+        doi_index=doi_index,
+    )
+    record_results(state, results)
+    return len([
+        result for result in results
+        if not result['error'] and not result['skipped']
+    ])
+
+
+def harvest_journal(journal, issn, full=False, rows=500, on_page=None):
+    """
+    Imports a journal's works from Crossref by ISSN. Works are requested
+    oldest update first and saved a page at a time, skipping DOIs the
+    journal already has using a DOIIndex loaded once for the run. The
+    harvest state's high water mark moves forward after each page, so an
+    interrupted harvest resumes from the last saved page and later runs
+    only fetch works updated since. Works that fail to import are saved on
+    the state and retried at the start of later runs instead of holding
+    the mark back.
+    :param journal: Journal object
+    :param issn: ISSN string
+    :param full: ignore the high water mark and harvest every work
+    :param rows: works per Crossref page
+    :param on_page: called with a dict of page counts after each page
+    :return: dict of fetched, skipped, imported, failed and retried counts
+    and the number of DOIs still failing
+    """
+    state, _created = models.HarvestState.objects.get_or_create(
+        journal=journal,
+        issn=issn,
+    )
+    since = None if full or not state.high_water_mark else state.high_water_mark.date()
+    totals = {'fetched': 0, 'skipped': 0, 'imported': 0, 'failed': 0, 'retried': 0}
+    author_index = logic.AuthorIndex()
+    doi_index = logic.DOIIndex(journal).load()
+
+    state.last_error = ''
+    try:
+        totals['retried'] = retry_failures(state, journal, author_index, doi_index)
+        state.harvested += totals['retried']
+        state.save()
+
+        for items in remote.iter_journal_works(issn, from_update_date=since, rows=rows):
+            fetched = [
+                (item['DOI'], {'message': item}, None)
+                for item in items if item.get('DOI') and item['DOI'] not in doi_index
+            ]
+            results = logic.save_doi_records(
+                fetched,
+                journal,
+                author_index,
+                doi_index=doi_index,
+            )
+            record_results(state, results)
+
+            page = {
+                'fetched': len(items),
+                'skipped': len(items) - len(fetched),
+                'imported': len([result for result in results if not result['error']]),
+                'failed': len([result for result in results if result['error']]),
+            }
+            for name, count in page.items():
+                totals[name] += count
+
+            marks = [mark for mark in (deposited(item) for item in items) if mark]
+            if marks and (not state.high_water_mark or max(marks) > state.high_water_mark):
+                state.high_water_mark = max(marks)
+            state.harvested += page['imported']
+            state.last_run = timezone.now()
+            state.save()
+
+            if on_page:
+                on_page(page)
+    except Exception as e:
+        state.last_error = logic.describe_error(e)
+        raise
+    finally:
+        state.last_run = timezone.now()
+        state.save()
+
+    totals['failing'] = len(state.failed_dois)
+    return totals
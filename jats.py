@@ -0,0 +1,272 @@
+import datetime
+from html import escape
+import re
+from xml.etree import ElementTree
+
+from django.db import transaction
+
+from identifiers import models as ident_models
+from plugins.back_content.logic import normalise_orcid
+from submission import models as submission_models
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+IDENTIFIER_TYPES = {
+    'doi': 'doi',
+    'publisher-id': 'pubid',
+}
+PUB_DATE_TYPES = ('epub', 'pub', 'ppub', 'collection')
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else tag
+
+
+def text_of(element):
+    if element is None:
+        return ''
+    return re.sub(r'\s+', ' ', ''.join(element.itertext())).strip()
+
+
+def read_front(source):
+    """
+    Streams a JATS document and returns its <front> element. Parsing stops
+    at the end of <front>, or at <body> when there is no <front>, and
+    elements outside <front> are cleared as they are read, so memory use
+    doesn't grow with the size of the file.
+    :param source: binary file object
+    :return: Element with namespaces stripped from its tags, or None
+    """
+    depth = 0
+    front_depth = None
+    for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+        name = local_name(element.tag)
+        if event == 'start':
+            depth += 1
+            if name == 'front' and front_depth is None:
+                front_depth = depth
+            elif name == 'body' and front_depth is None:
+                return None
+            continue
+
+        if front_depth is not None and depth == front_depth:
+            for child in element.iter():
+                child.tag = local_name(child.tag)
+            return element
+        if front_depth is None and depth > 1:
+            element.clear()
+        depth -= 1
+    return None
+
+
+def affiliation_text(aff):
+    institutions = [text_of(institution) for institution in aff.iter('institution')]
+    if any(institutions):
+        return ', '.join(institution for institution in institutions if institution)
+
+    parts = [aff.text or '']
+    for child in aff:
+        if child.tag != 'label':
+            parts.append(''.join(child.itertext()))
+        parts.append(child.tail or '')
+    return re.sub(r'\s+', ' ', ''.join(parts)).strip(' ,;')
+
+
+def parse_authors(front):
+    affiliations = {
+        aff.get('id'): affiliation_text(aff)
+        for aff in front.iter('aff') if aff.get('id')
+    }
+
+    authors = []
+    for contrib in front.iter('contrib'):
+        if contrib.get('contrib-type', 'author') != 'author':
+            continue
+        name = contrib.find('name')
+        if name is None:
+            name = contrib.find('string-name')
+        if name is None:
+            continue
+
+        institution = ''
+        aff = contrib.find('aff')
+        if aff is not None:
+            institution = affiliation_text(aff)
+        else:
+            for xref in contrib.iter('xref'):
+                if xref.get('ref-type') == 'aff':
+                    for rid in (xref.get('rid') or '').split():
+                        if affiliations.get(rid):
+                            institution = affiliations[rid]
+                            break
+                if institution:
+                    break
+
+        orcid = ''
+        for contrib_id in contrib.iter('contrib-id'):
+            if contrib_id.get('contrib-id-type') == 'orcid':
+                orcid = normalise_orcid(text_of(contrib_id))
+
+        authors.append({
+            'first_name': text_of(name.find('given-names')),
+            'last_name': text_of(name.find('surname')) or text_of(name),
+            'institution': institution,
+            'email': text_of(contrib.find('.//email')),
+            'orcid': orcid,
+        })
+    return authors
+
+
+def parse_pub_date(article_meta):
+    dates = {}
+    for pub_date in article_meta.findall('pub-date'):
+        date_type = pub_date.get('pub-type') or pub_date.get('date-type') or 'pub'
+        dates.setdefault(date_type, pub_date)
+
+    for date_type in PUB_DATE_TYPES + tuple(dates):
+        pub_date = dates.get(date_type)
+        if pub_date is None:
+            continue
+        parts = [text_of(pub_date.find(part)) for part in ('year', 'month', 'day')]
+        if not parts[0].isdigit():
+            continue
+        try:
+            return datetime.datetime(
+                int(parts[0]),
+                int(parts[1]) if parts[1].isdigit() else 1,
+                int(parts[2]) if parts[2].isdigit() else 1,
+            )
+        except ValueError:
+            continue
+    return None
+
+
+def parse_abstract(article_meta):
+    abstracts = article_meta.findall('abstract')
+    if not abstracts:
+        return ''
+    abstract = next(
+        (abstract for abstract in abstracts if not abstract.get('abstract-type')),
+        abstracts[0],
+    )
+    paragraphs = [text_of(p) for p in abstract.iter('p')]
+    if paragraphs:
+        return ''.join('<p>{0}</p>'.format(escape(p)) for p in paragraphs if p)
+    return escape(text_of(abstract))
+
+
+def extract_front_metadata(source):
+    """
+    Reads the article metadata from the <front> of a JATS document.
+    :param source: binary file object
+    :return: dict of article fields, authors and identifiers, or None when
+    the document has no <front>
+    """
+    front = read_front(source)
+    if front is None:
+        return None
+    article_meta = front.find('article-meta')
+    if article_meta is None:
+        return None
+
+    pages = {}
+    for name in ('fpage', 'lpage'):
+        page = text_of(article_meta.find(name))
+        if page.isdigit():
+            pages[name] = int(page)
+
+    return {
+        'title': text_of(article_meta.find('title-group/article-title')),
+        'abstract': parse_abstract(article_meta),
+        'date_published': parse_pub_date(article_meta),
+        'first_page': pages.get('fpage'),
+        'last_page': pages.get('lpage'),
+        'authors': parse_authors(article_meta),
+        'identifiers': [
+            (IDENTIFIER_TYPES[article_id.get('pub-id-type')], text_of(article_id))
+            for article_id in article_meta.findall('article-id')
+            if article_id.get('pub-id-type') in IDENTIFIER_TYPES and text_of(article_id)
+        ],
+    }
+
+
+def prefill_article(article, metadata):
+    """
+    Fills an article's blank fields from extracted JATS metadata. Frozen
+    authors are created when the article has none, and identifiers are
+    added for the types it doesn't have yet. Authors and identifiers are
+    each saved with one bulk insert.
+    :param article: Article object
+    :param metadata: dict from extract_front_metadata
+    :return: list of descriptions of what was filled in
+    """
+    filled = []
+    with transaction.atomic():
+        fields = [
+            name for name in ('title', 'abstract', 'date_published', 'first_page', 'last_page')
+            if metadata.get(name) and not getattr(article, name)
+        ]
+        for name in fields:
+            setattr(article, name, metadata[name])
+        if fields:
+            article.save(update_fields=fields)
+            filled.append(', '.join(name.replace('_', ' ') for name in fields))
+
+        if metadata['authors'] and not submission_models.FrozenAuthor.objects.filter(
+            article=article,
+        ).exists():
+            submission_models.FrozenAuthor.objects.bulk_create([
+                submission_models.FrozenAuthor(
+                    article=article,
+                    first_name=author['first_name'],
+                    last_name=author['last_name'],
+                    institution=author['institution'],
+                    frozen_email=author['email'] or None,
+                    frozen_orcid=author['orcid'] or None,
+                    order=order,
+                ) for order, author in enumerate(metadata['authors'])
+            ])
+            filled.append('{0} authors'.format(len(metadata['authors'])))
+
+        existing = set(
+            ident_models.Identifier.objects.filter(
+                article=article,
+            ).values_list('id_type', flat=True)
+        )
+        identifiers = []
+        for id_type, value in metadata['identifiers']:
+            if id_type not in existing:
+                existing.add(id_type)
+                identifiers.append(
+                    ident_models.Identifier(
+                        id_type=id_type,
+                        identifier=value,
+                        enabled=True,
+                        article=article,
+                    )
+                )
+        ident_models.Identifier.objects.bulk_create(identifiers)
+        if identifiers:
+            filled.append('{0} identifiers'.format(len(identifiers)))
+    return filled
+
+
+def prefill_from_galley(article, galley):
+    """
+    Prefills an article from the <front> of an XML galley.
+    :param article: Article object
+    :param galley: Galley object with an XML file
+    :return: list of descriptions of what was filled in
+    """
+    try:
+        with open(galley.file.self_article_path(), 'rb') as xml_file:
+            metadata = extract_front_metadata(xml_file)
+    except (ElementTree.ParseError, OSError) as e:
+        logger.warning(
+            'Could not read JATS front of galley {0}: {1}'.format(galley.pk, e),
+        )
+        return []
+    if not metadata:
+        return []
+    return prefill_article(article, metadata)
@@ -0,0 +1,170 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from plugins.back_content import ledger, logic, models, previews
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+JOB_CHUNK_SIZE = 25
+JOB_TIMEOUT = getattr(settings, 'BACK_CONTENT_JOB_TIMEOUT', 15 * 60)
+
+
+def enqueue(kind, journal, owner, items):
+    """
+    Queues an import job to be picked up by the process_back_content_jobs
+    management command.
+    :param kind: a JOB_KIND_CHOICES key
+    :param journal: Journal object
+    :param owner: Account object
+    :param items: list of DOIs or URLs
+    :return: ImportJob object
+    """
+    return models.ImportJob.objects.create(
+        kind=kind,
+        journal=journal,
+        owner=owner,
+        payload={'items': items},
+        total=len(items),
+    )
+
+
+def requeue_stale_jobs():
+    """
+    Puts running jobs whose worker hasn't saved progress for JOB_TIMEOUT
+    seconds back in the queue, as the worker most likely died. Items the
+    job already committed are in its batch's ledger, so the rerun skips
+    them.
+    :return: number of jobs requeued
+    """
+    cutoff = timezone.now() - datetime.timedelta(seconds=JOB_TIMEOUT)
+    count = models.ImportJob.objects.filter(
+        Q(heartbeat__lt=cutoff) | Q(heartbeat__isnull=True, date_started__lt=cutoff),
+        status=models.JOB_RUNNING,
+    ).update(
+        status=models.JOB_QUEUED,
+        date_started=None,
+        heartbeat=None,
+    )
+    if count:
+        logger.warning('Requeued {0} stale back content job(s).'.format(count))
+    return count
+
+
+def claim_next_job():
+    """
+    Marks the oldest queued job as running and returns it, after requeuing
+    stale running jobs. Rows locked by another worker are skipped so
+    several workers can drain the queue.
+    :return: ImportJob object or None
+    """
+    requeue_stale_jobs()
+    with transaction.atomic():
+        job = models.ImportJob.objects.select_for_update(
+            skip_locked=True,
+        ).filter(
+            status=models.JOB_QUEUED,
+        ).order_by(
+            'pk',
+        ).first()
+
+        if job:
+            job.status = models.JOB_RUNNING
+            job.date_started = timezone.now()
+            job.heartbeat = job.date_started
+            job.save()
+    return job
+
+
+def _import_chunk(job, chunk, author_index, batch_ledger, doi_index):
+    if job.kind == 'preview':
+        return previews.warm_previews(chunk)
+    elif job.kind == 'doi':
+        results = logic.import_dois(
+            chunk,
+            job.journal,
+            author_index=author_index,
+            ledger=batch_ledger,
+            doi_index=doi_index,
+        )
+    else:
+        results = logic.import_urls(chunk, job.journal, ledger=batch_ledger)
+
+    return [
+        {
+            'key': result.get('doi') or result.get('url'),
+            'article_id': result['article'].pk if result['article'] else None,
+            'error': result['error'],
+            'skipped': result['skipped'],
+        } for result in results
+    ]
+
+
+def run_job(job):
+    """
+    Runs a claimed job, saving progress after each chunk of items so it can
+    be polled from the job status endpoint. Imported DOIs and URLs are
+    recorded in the batch's ledger, so rerunning the same items after a
+    crash skips those already committed.
+    :param job: ImportJob object
+    """
+    items = job.payload.get('items', [])
+    results = []
+    author_index = logic.AuthorIndex()
+    try:
+        batch_ledger = None
+        if job.kind != 'preview':
+            batch_ledger = ledger.Ledger(
+                job.journal,
+                ledger.batch_key(job.journal, job.kind, items),
+            ).load()
+        doi_index = logic.DOIIndex(job.journal).load() if job.kind == 'doi' else None
+
+        for i in range(0, len(items), JOB_CHUNK_SIZE):
+            results.extend(
+                _import_chunk(
+                    job,
+                    items[i:i + JOB_CHUNK_SIZE],
+                    author_index,
+                    batch_ledger,
+                    doi_index,
+                ),
+            )
+            models.ImportJob.objects.filter(pk=job.pk).update(
+                progress=len(results),
+                heartbeat=timezone.now(),
+            )
+        job.status = models.JOB_COMPLETE
+    except Exception as e:
+        job.status = models.JOB_FAILED
+        job.error = logic.describe_error(e)
+
+    job.progress = len(results)
+    job.results = results
+    job.date_finished = timezone.now()
+    job.save()
+
+
+def drain_queue(max_jobs=None):
+    """
+    Runs queued jobs until the queue is empty. A job that raises is logged
+    and left running, to be requeued once it times out, and the next job
+    is claimed.
+    :param max_jobs: stop after this many jobs
+    :return: number of jobs run
+    """
+    count = 0
+    while max_jobs is None or count < max_jobs:
+        job = claim_next_job()
+        if not job:
+            break
+        try:
+            run_job(job)
+        except Exception:
+            logger.exception('Back content job {0} failed.'.format(job.pk))
+        count += 1
+    return count
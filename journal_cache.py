@@ -0,0 +1,94 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.forms.models import ModelChoiceIterator
+
+from submission import models
+
+
+CONFIG_CACHE_TIMEOUT = getattr(settings, 'BACK_CONTENT_CONFIG_CACHE_TIMEOUT', 60 * 60)
+GLOBAL_VERSION_KEY = 'back_content:config:version'
+
+
+def _version_key(journal_id):
+    return 'back_content:journal:{0}:version'.format(journal_id)
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(journal_id=None):
+    """
+    Invalidates the cached config for a journal, or for every journal when
+    journal_id is None, by bumping a version number used in the cache key.
+    :param journal_id: Journal pk or None
+    """
+    key = _version_key(journal_id) if journal_id else GLOBAL_VERSION_KEY
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+def get_journal_config(journal):
+    """
+    Returns the choice lists and submission configuration used to build
+    the back content forms, cached per journal until one of them changes.
+    :param journal: Journal object
+    :return: dict
+    """
+    key = 'back_content:journal:{0}:config:{1}:{2}'.format(
+        journal.pk,
+        _get_version(GLOBAL_VERSION_KEY),
+        _get_version(_version_key(journal.pk)),
+    )
+    config = cache.get(key)
+    if config is None:
+        config = {
+            'sections': list(models.Section.objects.filter(journal=journal)),
+            'licences': list(
+                models.Licence.objects.filter(
+                    journal=journal,
+                    available_for_submission=True,
+                )
+            ),
+            'fields': list(journal.field_set.all()),
+            'issues': list(journal.issue_set.all()),
+            'abstract_required': journal.get_setting(
+                'general',
+                'abstract_required',
+            ),
+            'configuration': journal.submissionconfiguration,
+        }
+        cache.set(key, config, CONFIG_CACHE_TIMEOUT)
+    return config
+
+
+class CachedModelChoiceIterator(ModelChoiceIterator):
+    """
+    Renders a ModelChoiceField's choices from a list of already loaded
+    objects. The field's queryset is still used to validate submissions.
+    """
+    def __init__(self, field, objects):
+        super().__init__(field)
+        self.objects = objects
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.objects:
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.objects) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.objects)
+
+
+def use_cached_choices(field, objects):
+    field.iterator = lambda field: CachedModelChoiceIterator(field, objects)
+    field.widget.choices = field.choices
@@ -0,0 +1,75 @@
+import hashlib
+
+from plugins.back_content import models
+
+
+def hash_key(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def batch_key(journal, kind, source_keys):
+    """
+    Derives a batch key from a journal, an import kind and the batch's
+    source keys, so resubmitting the same batch finds the earlier run's
+    ledger.
+    :param journal: Journal object
+    :param kind: import kind, eg. 'doi'
+    :param source_keys: iterable of source key strings
+    :return: hex digest string
+    """
+    digest = hashlib.sha256('{0}:{1}'.format(journal.pk, kind).encode('utf-8'))
+    for key in sorted(set(source_keys)):
+        digest.update(b'\n')
+        digest.update(key.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Ledger(object):
+    """
+    The committed items of an import batch. Entries for the batch are loaded
+    in one query so checking an item is a dict lookup, and each item is
+    recorded inside the transaction that commits it.
+    """
+    def __init__(self, journal, batch_key):
+        self.journal = journal
+        self.batch_key = batch_key
+        self.completed = {}
+
+    def load(self):
+        # Entries whose article was deleted don't count as complete, so the
+        # item is imported again.
+        entries = models.ImportLedgerEntry.objects.filter(
+            batch_key=self.batch_key,
+            article__isnull=False,
+        ).select_related(
+            'article',
+        )
+        self.completed = {entry.key_hash: entry for entry in entries}
+        return self
+
+    def get(self, source_key):
+        """
+        Returns the ledger entry for a committed item or None.
+        """
+        return self.completed.get(hash_key(source_key))
+
+    def is_complete(self, source_key):
+        return hash_key(source_key) in self.completed
+
+    def record(self, source_key, article=None):
+        """
+        Records an item as committed. Call inside the item's transaction.
+        :param source_key: DOI, URL or file key string
+        :param article: Article the item created or updated
+        """
+        entry, _created = models.ImportLedgerEntry.objects.update_or_create(
+            batch_key=self.batch_key,
+            key_hash=hash_key(source_key),
+            defaults={
+                'journal': self.journal,
+                'source_key': source_key,
+                'article': article,
+            },
+        )
+        self.completed[entry.key_hash] = entry
+        return entry
@@ -1,90 +1,1005 @@
+import base64
+import collections
+import contextlib
 import datetime
+import functools
+import json
+import re
+import time
+import unicodedata
 import uuid
-from bs4 import BeautifulSoup
 
 from django.contrib import messages
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Lower
 from django.shortcuts import reverse, redirect
 
 from submission import models
 from identifiers import models as ident_models
 from core import models as core_models
+from plugins.back_content import metrics, parsers, remote
+from plugins.back_content.metrics import QueryCounter
+from utils.logger import get_logger
 
+logger = get_logger(__name__)
 
-def parse_url_results(r, request):
-    soup = BeautifulSoup(r.text, 'lxml')
+ORCID_RE = re.compile(r'\d{4}-\d{4}-\d{4}-\d{3}[\dXx]')
+# Authors per candidate account query, which keeps each query well under
+# SQLite's limit of 999 parameters.
+AUTHOR_QUERY_CHUNK_SIZE = 100
 
-    title = soup.find('meta', {'name': "citation_title"}).get('content', '')
-    pub_date = soup.find('meta', {'name': "citation_date"}).get('content', '')
-    doi = soup.find('meta', {'name': "citation_doi"}).get('content', None)
-    lang = soup.find('meta', {'name': "citation_language"}).get('content', '')
-    abstract = soup.find('meta', {'name': "description"}).get('content', '')
 
-    article = models.Article.objects.create(
-        title=title,
-        date_published=pub_date,
-        language=lang,
-        abstract=abstract,
-        is_remote=True,
-        remote_url=r.url,
-        journal=request.journal
+@metrics.instrument('parse_url_results')
+def parse_url_results(r, request, journal=None):
+    """
+    Creates an article from the citation meta tags of a landing page.
+    :param r: requests Response for the landing page
+    :param request: HttpRequest or None, when None no messages are added
+    :param journal: Journal object, defaults to request.journal
+    :return: Article object
+    """
+    journal = journal or request.journal
+    metrics.add_bytes('parse_url_results', len(r.text))
+    meta = parsers.extract_citation_meta(r.text)
+
+    title = parsers.first_meta(meta, 'citation_title')
+    pub_date = parsers.first_meta(
+        meta,
+        'citation_date',
+        'citation_publication_date',
+        'citation_online_date',
+        default=None,
     )
+    if pub_date:
+        pub_date = pub_date.replace('/', '-')
+    doi = parsers.first_meta(meta, 'citation_doi', default=None)
+    lang = parsers.first_meta(meta, 'citation_language')
+    abstract = parsers.first_meta(meta, 'description', 'citation_abstract')
+
+    fields = {
+        'title': title,
+        'date_published': pub_date,
+        'language': lang,
+        'abstract': abstract,
+        'is_remote': True,
+        'remote_url': r.url,
+        'journal': journal,
+    }
+    article = find_existing_article(journal, doi=doi, url=r.url)
+    updated = article is not None
+    if updated:
+        update_article(article, fields)
+    else:
+        article = models.Article.objects.create(**fields)
 
     if doi:
-        identifier = ident_models.Identifier.objects.create(
+        identifier, id_created = ident_models.Identifier.objects.get_or_create(
             id_type='doi',
             identifier=doi,
-            enabled=True,
-            article=article
+            article=article,
+            defaults={'enabled': True},
         )
 
-        id_message = 'Identifier {0} created.'.format(identifier)
-        messages.add_message(request, messages.SUCCESS, id_message)
+        if request and id_created:
+            id_message = 'Identifier {0} created.'.format(identifier)
+            messages.add_message(request, messages.SUCCESS, id_message)
 
-    messages.add_message(request, messages.SUCCESS, 'Article created.')
+    if request:
+        messages.add_message(
+            request,
+            messages.SUCCESS,
+            'Article updated.' if updated else 'Article created.',
+        )
     return article
 
 
-def get_and_parse_doi_metadata(r, request, doi):
+def find_existing_article(journal, doi=None, url=None):
+    """
+    Finds an article in the journal that was already imported from a DOI or
+    landing page, so a repeated import updates it instead of duplicating it.
+    :param journal: Journal object
+    :param doi: DOI string
+    :param url: remote URL string
+    :return: Article object or None
+    """
+    if doi:
+        identifier = ident_models.Identifier.objects.filter(
+            id_type='doi',
+            identifier=doi,
+            article__journal=journal,
+        ).select_related(
+            'article',
+        ).first()
+        if identifier:
+            return identifier.article
+    if url:
+        return models.Article.objects.filter(
+            journal=journal,
+            remote_url=url,
+        ).first()
+    return None
+
+
+def update_article(article, fields):
+    """
+    Updates an existing article with freshly imported metadata.
+    :param article: Article object
+    :param fields: dict of field name to value
+    """
+    for name, value in fields.items():
+        setattr(article, name, value)
+    article.save(update_fields=list(fields))
+
+
+@metrics.instrument('get_and_parse_doi_metadata')
+def get_and_parse_doi_metadata(r, request, doi, journal=None, author_index=None):
+    """
+    Creates an article from a Crossref work record. Authors are matched
+    against existing accounts and only unmatched authors get a new account.
+    :param r: decoded Crossref JSON response
+    :param request: HttpRequest or None, when None no messages are added
+    :param doi: DOI string
+    :param journal: Journal object, defaults to request.journal
+    :param author_index: AuthorIndex shared across an import run, one is
+    built for this record when not provided
+    :return: Article object
+    """
+    journal = journal or request.journal
     message = r.get('message')
+    if author_index is None:
+        author_index = AuthorIndex()
+        author_index.load([r])
 
-    title = message.get('title', '')[0]
-    date_parts = message.get('published-online').get("date-parts")[0]
-    pub_date = datetime.datetime(year=date_parts[0], month=date_parts[1], day=date_parts[2])
+    # Front matter and some other works have no title, or an empty list.
+    title = (message.get('title') or [''])[0]
+    pub_date = crossref_date(message)
     doi = doi
     abstract = message.get('abstract', '')
 
-    article = models.Article.objects.create(
-        title=title,
-        date_published=pub_date,
-        abstract=abstract,
-        is_remote=True,
-        remote_url='https://doi.org/{0}'.format(doi),
-        journal=request.journal
+    with QueryCounter() as counter, transaction.atomic():
+        fields = {
+            'title': title,
+            'date_published': pub_date,
+            'abstract': abstract,
+            'is_remote': True,
+            'remote_url': 'https://doi.org/{0}'.format(doi),
+            'journal': journal,
+        }
+        article = find_existing_article(journal, doi=doi)
+        updated = article is not None
+        current_authors = AuthorIndex()
+        if updated:
+            update_article(article, fields)
+            for account in article.authors.all():
+                current_authors.add(account)
+        else:
+            article = models.Article.objects.create(**fields)
+
+        identifiers = []
+        if doi and not updated:
+            identifiers.append(
+                ident_models.Identifier(
+                    id_type='doi',
+                    identifier=doi,
+                    enabled=True,
+                    article=article
+                )
+            )
+            ident_models.Identifier.objects.bulk_create(identifiers)
+
+        authors = []
+        new_authors = []
+        for author in message.get('author', None) or []:
+            affiliation = author['affiliation'][0].get('name', '') if len(author.get('affiliation', [])) > 0 else ""
+            orcid = normalise_orcid(author.get('ORCID', ''))
+            match_kwargs = {
+                'orcid': orcid,
+                'first_name': author.get('given', ''),
+                'last_name': author.get('family', ''),
+                'institution': affiliation,
+            }
+            existing = (
+                current_authors.match(**match_kwargs) or
+                author_index.match(**match_kwargs)
+            )
+            if existing:
+                authors.append(existing)
+                continue
+
+            email = "{0}@journal.com".format(uuid.uuid4())
+            new_author = core_models.Account(
+                email=email,
+                username=email,
+                first_name=author.get('given', ''),
+                last_name=author.get('family', ''),
+                institution=affiliation,
+                orcid=orcid or None,
+            )
+            authors.append(new_author)
+            new_authors.append(new_author)
+
+        created = bulk_create_with_pks(core_models.Account, new_authors, 'email')
+        created_by_email = {account.email: account for account in created}
+        authors = [created_by_email.get(account.email, account) for account in authors]
+        if authors:
+            article.authors.add(*authors)
+
+    for account in created:
+        author_index.add(account)
+
+    logger.info(
+        'Imported DOI {0} as article {1} with {2} authors in {3} queries.'.format(
+            doi,
+            article.pk,
+            len(authors),
+            counter.count,
+        )
     )
 
-    if doi:
-        identifier = ident_models.Identifier.objects.create(
+    if request:
+        for identifier in identifiers:
+            id_message = 'Identifier {0} created.'.format(identifier)
+            messages.add_message(request, messages.SUCCESS, id_message)
+        messages.add_message(
+            request,
+            messages.SUCCESS,
+            'Article {0} with {1} authors, {2} matched to existing '
+            'accounts ({3} queries).'.format(
+                'updated' if updated else 'created',
+                len(authors),
+                len(authors) - len(created),
+                counter.count,
+            ),
+        )
+    article.import_query_count = counter.count
+    return article
+
+
+def crossref_date(message):
+    """
+    Reads the publication date of a Crossref work, preferring the online
+    date. Missing months and days default to 1.
+    :param message: the message of a Crossref work response
+    :return: datetime or None
+    """
+    for name in ('published-online', 'published-print', 'issued'):
+        date_parts = (message.get(name) or {}).get('date-parts') or [[]]
+        date_parts = [part for part in date_parts[0] if part]
+        if date_parts:
+            date_parts += [1] * (3 - len(date_parts))
+            return datetime.datetime(*date_parts[:3])
+    return None
+
+
+def normalise_orcid(orcid):
+    """
+    Extracts a bare ORCID iD from an ORCID URL or string.
+    :param orcid: string
+    :return: bare ORCID iD string or empty string
+    """
+    match = ORCID_RE.search(orcid or '')
+    return match.group(0).upper() if match else ''
+
+
+def normalise_name(value):
+    """
+    Lower-cases a name, strips accents and punctuation and collapses
+    whitespace so that names can be compared.
+    :param value: string
+    :return: normalised string
+    """
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    value = re.sub(r'[^\w\s]', ' ', value.casefold())
+    return ' '.join(value.split())
+
+
+class AuthorIndex(object):
+    """
+    In-memory index of existing accounts used to match imported authors by
+    ORCID, email or normalised name plus affiliation. Candidates for a set of
+    records are loaded in a few bounded queries, and accounts created during
+    the import run are added so repeat authors across a batch resolve to one
+    account.
+    """
+    def __init__(self):
+        self.by_orcid = {}
+        self.by_email = {}
+        self.by_name = {}
+
+    @staticmethod
+    def variants(value):
+        return {value, value.title(), value.upper()}
+
+    def load(self, records):
+        """
+        Loads candidate accounts for the authors of a list of Crossref
+        records: those with one of the authors' ORCIDs, or with both the
+        given and family name of one of the authors. Queries cover
+        AUTHOR_QUERY_CHUNK_SIZE ORCIDs and names at a time.
+        :param records: list of decoded Crossref JSON responses
+        """
+        orcids = set()
+        names = set()
+        for record in records:
+            for author in record.get('message', {}).get('author', None) or []:
+                orcid = normalise_orcid(author.get('ORCID', ''))
+                if orcid:
+                    orcids.add(orcid)
+                family = (author.get('family') or '').strip()
+                if family:
+                    names.add((family, (author.get('given') or '').strip()))
+
+        orcids = sorted(orcids)
+        names = sorted(names)
+        for i in range(0, max(len(orcids), len(names)), AUTHOR_QUERY_CHUNK_SIZE):
+            query = Q()
+            orcid_chunk = orcids[i:i + AUTHOR_QUERY_CHUNK_SIZE]
+            if orcid_chunk:
+                query |= Q(orcid__in=orcid_chunk)
+            name_chunk = names[i:i + AUTHOR_QUERY_CHUNK_SIZE]
+            if name_chunk:
+                last_names = set()
+                first_names = set()
+                for family, given in name_chunk:
+                    last_names.update(self.variants(family))
+                    first_names.update(self.variants(given))
+                query |= Q(last_name__in=last_names, first_name__in=first_names)
+
+            accounts = core_models.Account.objects.filter(query).only(
+                'pk',
+                'email',
+                'orcid',
+                'first_name',
+                'last_name',
+                'institution',
+            )
+            for account in accounts:
+                self.add(account)
+
+    def add(self, account):
+        orcid = normalise_orcid(account.orcid)
+        if orcid:
+            self.by_orcid.setdefault(orcid, account)
+        if account.email and not account.email.endswith('@journal.com'):
+            self.by_email.setdefault(account.email.lower(), account)
+        key = self.name_key(
+            account.first_name,
+            account.last_name,
+            account.institution,
+        )
+        if key:
+            self.by_name.setdefault(key, account)
+
+    @staticmethod
+    def name_key(first_name, last_name, institution):
+        name = normalise_name('{0} {1}'.format(first_name, last_name))
+        institution = normalise_name(institution)
+        if not name or not institution:
+            return None
+        return name, institution
+
+    def match(self, orcid=None, email=None, first_name='', last_name='',
+              institution=''):
+        """
+        Returns the matching account or None.
+        """
+        if orcid and normalise_orcid(orcid) in self.by_orcid:
+            return self.by_orcid[normalise_orcid(orcid)]
+        if email and email.lower() in self.by_email:
+            return self.by_email[email.lower()]
+        key = self.name_key(first_name, last_name, institution)
+        if key:
+            return self.by_name.get(key)
+        return None
+
+
+def bulk_create_with_pks(model, objects, lookup_field=None, batch_size=500):
+    """
+    Bulk creates objects and makes sure each one has its primary key set.
+    Backends that can't return ids from a bulk insert are re-queried once
+    using a unique lookup field, or saved one by one when there isn't one.
+    :param model: Model class
+    :param objects: list of unsaved model instances
+    :param lookup_field: name of a field that is unique across objects
+    :param batch_size: rows per INSERT
+    :return: list of saved model instances
+    """
+    if not objects:
+        return []
+
+    if not connection.features.can_return_rows_from_bulk_insert and not lookup_field:
+        for obj in objects:
+            obj.save()
+        return objects
+
+    created = model.objects.bulk_create(objects, batch_size=batch_size)
+    if all(obj.pk for obj in created):
+        return created
+
+    values = [getattr(obj, lookup_field) for obj in created]
+    saved = model.objects.in_bulk(values, field_name=lookup_field)
+    return [saved[value] for value in values]
+
+
+DOI_PREFIXES = ('https://doi.org/', 'http://doi.org/',
+                'https://dx.doi.org/', 'http://dx.doi.org/', 'doi:')
+
+
+def normalise_doi(doi):
+    """
+    Strips whitespace and resolver/scheme prefixes from a DOI.
+    :param doi: DOI or DOI URL string
+    :return: bare DOI string
+    """
+    doi = doi.strip()
+    for prefix in DOI_PREFIXES:
+        if doi.lower().startswith(prefix):
+            return doi[len(prefix):].strip()
+    return doi
+
+
+def parse_doi_list(text):
+    """
+    Splits a block of text into a de-duplicated list of DOIs, one per line
+    or separated by commas/whitespace.
+    :param text: string
+    :return: list of DOI strings in input order
+    """
+    dois = []
+    seen = set()
+    for token in text.replace(',', ' ').split():
+        doi = normalise_doi(token)
+        if doi and doi.lower() not in seen:
+            seen.add(doi.lower())
+            dois.append(doi)
+    return dois
+
+
+def describe_error(error):
+    return '{0}: {1}'.format(type(error).__name__, error)
+
+
+def completed_results(keys, key_name, ledger=None):
+    """
+    Builds results for the keys a batch ledger has already recorded.
+    :param keys: list of DOIs or URLs
+    :param key_name: 'doi' or 'url'
+    :param ledger: Ledger or None
+    :return: dict of key to result dict
+    """
+    completed = {}
+    if ledger:
+        for key in keys:
+            entry = ledger.get(key)
+            if entry:
+                completed[key] = {
+                    key_name: key,
+                    'article': entry.article,
+                    'error': None,
+                    'skipped': True,
+                }
+    return completed
+
+
+def save_url_responses(fetched, journal, ledger=None):
+    """
+    Creates an article for each fetched landing page, each in its own
+    transaction.
+    :param fetched: list of (url, response, error) tuples
+    :param journal: Journal object
+    :param ledger: Ledger to record imported URLs in
+    :return: list of dicts with url, article, error and skipped keys
+    """
+    results = []
+    for url, r, error in fetched:
+        article = None
+        if not error:
+            try:
+                with transaction.atomic():
+                    article = parse_url_results(r, None, journal=journal)
+                    if ledger:
+                        ledger.record(url, article)
+            except Exception as e:
+                error = e
+        results.append({
+            'url': url,
+            'article': article,
+            'error': describe_error(error) if error else None,
+            'skipped': False,
+        })
+    return results
+
+
+def import_urls(urls, journal, ledger=None):
+    """
+    Fetches each landing page and creates an article from its meta tags.
+    :param urls: list of URL strings
+    :param journal: Journal object
+    :param ledger: Ledger of the batch, URLs it has recorded are skipped
+    and imported URLs are recorded
+    :return: list of dicts with url, article, error and skipped keys
+    """
+    completed = completed_results(urls, 'url', ledger)
+    results = []
+    for url in urls:
+        if url in completed:
+            results.append(completed[url])
+            continue
+
+        try:
+            fetched = (url, remote.fetch_url(url), None)
+        except Exception as e:
+            fetched = (url, None, e)
+        results.extend(save_url_responses([fetched], journal, ledger))
+    return results
+
+
+def save_doi_records(fetched, journal, author_index=None, ledger=None,
+                     doi_index=None):
+    """
+    Creates an article for each fetched Crossref record, each in its own
+    transaction so a bad record doesn't affect the rest of the batch.
+    :param fetched: list of (doi, record, error) tuples
+    :param journal: Journal object
+    :param author_index: AuthorIndex to reuse across calls
+    :param ledger: Ledger to record imported DOIs in
+    :param doi_index: DOIIndex to add imported DOIs to
+    :return: list of dicts with doi, article, error and skipped keys
+    """
+    if author_index is None:
+        author_index = AuthorIndex()
+    author_index.load([record for _doi, record, error in fetched if not error])
+
+    results = []
+    for doi, record, error in fetched:
+        article = None
+        if not error:
+            try:
+                with transaction.atomic():
+                    article = get_and_parse_doi_metadata(
+                        record,
+                        None,
+                        doi=doi,
+                        journal=journal,
+                        author_index=author_index,
+                    )
+                    if ledger:
+                        ledger.record(doi, article)
+                if doi_index is not None:
+                    doi_index.add(doi, article)
+            except Exception as e:
+                error = e
+        results.append({
+            'doi': doi,
+            'article': article,
+            'error': describe_error(error) if error else None,
+            'skipped': False,
+        })
+    return results
+
+
+class DOIIndex(object):
+    """
+    The DOIs of a journal's articles, lower-cased with resolver prefixes
+    stripped, loaded in one query so a batch can be checked for DOIs the
+    journal already has before anything is fetched.
+    """
+    def __init__(self, journal):
+        self.journal = journal
+        self.articles = {}
+
+    @staticmethod
+    def key(doi):
+        return normalise_doi(doi or '').lower()
+
+    @classmethod
+    def lookup(cls, journal, doi):
+        """
+        Finds the article a journal has for a single DOI without loading the
+        journal's whole DOI set. The bare DOI and its resolver prefixed
+        forms are compared with LOWER(identifier), which the index added in
+        migration 0009 serves.
+        :param journal: Journal object
+        :param doi: DOI or DOI URL string
+        :return: article id or None
+        """
+        key = cls.key(doi)
+        if not key:
+            return None
+        return ident_models.Identifier.objects.annotate(
+            doi_key=Lower('identifier'),
+        ).filter(
             id_type='doi',
-            identifier=doi,
-            enabled=True,
-            article=article
+            article__journal=journal,
+            doi_key__in=[key] + [prefix + key for prefix in DOI_PREFIXES],
+        ).values_list(
+            'article_id',
+            flat=True,
+        ).first()
+
+    def load(self):
+        identifiers = ident_models.Identifier.objects.filter(
+            id_type='doi',
+            article__journal=self.journal,
+        ).values_list(
+            'identifier',
+            'article_id',
         )
+        for doi, article_id in identifiers.iterator():
+            self.articles[self.key(doi)] = article_id
+        return self
+
+    def __contains__(self, doi):
+        return self.key(doi) in self.articles
+
+    def __len__(self):
+        return len(self.articles)
 
-        id_message = 'Identifier {0} created.'.format(identifier)
-        messages.add_message(request, messages.SUCCESS, id_message)
+    def get(self, doi):
+        return self.articles.get(self.key(doi))
 
-    for author in message.get('author', None):
-        affiliation = author['affiliation'][0].get('name', '') if len(author['affiliation']) > 0 else ""
-        new_author = core_models.Account.objects.create(
-            email="{0}@journal.com".format(uuid.uuid4()),
-            first_name=author.get('given', ''),
-            last_name=author.get('family', ''),
-            institution=affiliation,
+    def add(self, doi, article):
+        self.articles[self.key(doi)] = article.pk
+
+    def existing_results(self, dois):
+        """
+        Builds results for the DOIs the journal already has, loading their
+        articles in one query.
+        :param dois: list of DOI strings
+        :return: dict of DOI to result dict
+        """
+        existing = {doi: self.get(doi) for doi in dois if doi in self}
+        articles = models.Article.objects.in_bulk(set(existing.values()))
+        return {
+            doi: {
+                'doi': doi,
+                'article': articles.get(article_id),
+                'error': None,
+                'skipped': True,
+            } for doi, article_id in existing.items()
+        }
+
+
+def import_dois(dois, journal, workers=None, author_index=None, ledger=None,
+                doi_index=None):
+    """
+    Fetches Crossref metadata for a list of DOIs concurrently and creates an
+    article for each record. DOIs the journal already has are skipped
+    before anything is fetched.
+    :param dois: list of DOI strings
+    :param journal: Journal object
+    :param workers: max concurrent fetches
+    :param author_index: AuthorIndex to reuse across calls
+    :param ledger: Ledger of the batch, DOIs it has recorded are skipped
+    without being fetched and imported DOIs are recorded
+    :param doi_index: DOIIndex to reuse across calls, loaded for the
+    journal when not given
+    :return: list of dicts with doi, article, error and skipped keys
+    """
+    if doi_index is None:
+        doi_index = DOIIndex(journal).load()
+    completed = completed_results(dois, 'doi', ledger)
+    completed.update(
+        doi_index.existing_results([doi for doi in dois if doi not in completed]),
+    )
+    if completed:
+        logger.info(
+            'Skipping {0} of {1} DOIs already imported into {2}.'.format(
+                len(completed),
+                len(dois),
+                journal.code,
+            )
         )
-        article.authors.add(new_author)
 
-    messages.add_message(request, messages.SUCCESS, 'Article created.')
-    return article
+    fetched = list(
+        remote.fetch_crossref_works(
+            [doi for doi in dois if doi not in completed],
+            workers=workers,
+        )
+    )
+    saved = {
+        result['doi']: result
+        for result in save_doi_records(fetched, journal, author_index, ledger, doi_index)
+    }
+    return [completed.get(doi) or saved[doi] for doi in dois]
+
+
+class StepTimer(object):
+    """
+    Accumulates wall time per named step.
+    """
+    def __init__(self):
+        self.timings = {}
+
+    @contextlib.contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0) + time.perf_counter() - start
+
+
+def bulk_publish(articles, request, issue=None, batch_size=50, raise_events=True):
+    """
+    Publishes many articles. Each batch runs in one transaction: DOIs are
+    minted only for articles without one, issue membership is added with
+    one M2M add per issue and the stage is set with a single UPDATE. The
+    article published events are raised once all batches are committed.
+    :param articles: list of Article objects
+    :param request: HttpRequest
+    :param issue: Issue object, when set it becomes each article's primary
+    issue
+    :param batch_size: articles per transaction
+    :param raise_events: set to False to skip the published events
+    :return: dict with published, skipped and timings
+    """
+    from identifiers.logic import generate_crossref_doi_with_pattern
+    from events.logic import Events
+
+    timer = StepTimer()
+    skipped = []
+    to_publish = []
+
+    with timer.step('validate'):
+        for article in articles:
+            if article.stage == models.STAGE_PUBLISHED:
+                continue
+            if issue:
+                article.primary_issue = issue
+            if not article.date_published or not article.primary_issue:
+                skipped.append(article)
+            else:
+                to_publish.append(article)
+
+    mint_dois = request.journal.get_setting('plugin:ezid', 'ezid_plugin_enable')
+
+    for i in range(0, len(to_publish), batch_size):
+        batch = to_publish[i:i + batch_size]
+        pks = [article.pk for article in batch]
+
+        with transaction.atomic():
+            if issue:
+                with timer.step('issue'):
+                    models.Article.objects.filter(
+                        pk__in=pks,
+                    ).update(
+                        primary_issue=issue,
+                    )
+
+            if mint_dois:
+                with timer.step('doi'):
+                    has_doi = set(
+                        ident_models.Identifier.objects.filter(
+                            article__in=pks,
+                            id_type='doi',
+                        ).values_list('article_id', flat=True)
+                    )
+                    for article in batch:
+                        if article.pk not in has_doi:
+                            generate_crossref_doi_with_pattern(article)
+
+            with timer.step('issue'):
+                by_issue = {}
+                for article in batch:
+                    by_issue.setdefault(article.primary_issue, []).append(article)
+                for primary_issue, issue_articles in by_issue.items():
+                    primary_issue.articles.add(*issue_articles)
+
+            with timer.step('snapshot'):
+                for article in batch:
+                    article.snapshot_authors(article)
+
+            with timer.step('stage'):
+                models.Article.objects.filter(
+                    pk__in=pks,
+                ).update(
+                    stage=models.STAGE_PUBLISHED,
+                )
+                for article in batch:
+                    article.stage = models.STAGE_PUBLISHED
+
+    events = to_publish if raise_events else []
+    with timer.step('events'), metrics.stage('events'):
+        for article in events:
+            kwargs = {'article': article,
+                      'request': request}
+            Events.raise_event(
+                Events.ON_ARTICLE_PUBLISHED,
+                task_object=article,
+                **kwargs,
+            )
+
+    return {
+        'published': to_publish,
+        'skipped': skipped,
+        'timings': timer.timings,
+    }
+
+
+INDEX_SORTS = {
+    'id': ('pk',),
+    '-id': ('-pk',),
+    'title': ('title', 'pk'),
+    '-title': ('-title', '-pk'),
+}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+
+
+def unpublished_articles_page(journal, search=None, sort='-id', cursor=None, limit=25):
+    """
+    Returns one page of a journal's unpublished articles using keyset
+    pagination, so the cost of a page doesn't grow with its position.
+    :param journal: Journal object
+    :param search: text to match against titles and author names
+    :param sort: an INDEX_SORTS key
+    :param cursor: opaque cursor returned for the previous page
+    :param limit: page size
+    :return: tuple of list of row dicts and the next page cursor or None
+    """
+    ordering = INDEX_SORTS.get(sort, INDEX_SORTS['-id'])
+    articles = models.Article.objects.filter(
+        journal=journal,
+    ).exclude(
+        stage=models.STAGE_PUBLISHED,
+    ).select_related(
+        'correspondence_author',
+        'section',
+    ).only(
+        'pk',
+        'title',
+        'date_submitted',
+        'section',
+        'correspondence_author__first_name',
+        'correspondence_author__middle_name',
+        'correspondence_author__last_name',
+    )
+
+    if search:
+        articles = articles.filter(
+            Q(title__icontains=search)
+            | Q(correspondence_author__first_name__icontains=search)
+            | Q(correspondence_author__last_name__icontains=search)
+            | Exists(
+                models.FrozenAuthor.objects.filter(
+                    article=OuterRef('pk'),
+                    last_name__icontains=search,
+                )
+            )
+        )
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        if ordering[0] == 'pk':
+            articles = articles.filter(pk__gt=position[-1])
+        elif ordering[0] == '-pk':
+            articles = articles.filter(pk__lt=position[-1])
+        elif ordering[0] == 'title':
+            articles = articles.filter(
+                Q(title__gt=position[0]) | Q(title=position[0], pk__gt=position[1]),
+            )
+        else:
+            articles = articles.filter(
+                Q(title__lt=position[0]) | Q(title=position[0], pk__lt=position[1]),
+            )
+
+    page = list(articles.order_by(*ordering)[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_cursor = encode_cursor(
+            [last.title, last.pk] if 'title' in ordering[0] else [last.pk],
+        )
+
+    rows = []
+    for article in page:
+        author = article.correspondence_author
+        rows.append({
+            'id': article.pk,
+            'title': article.safe_title,
+            'date_submitted': article.date_submitted.isoformat() if article.date_submitted else None,
+            'author': ' '.join(
+                name for name in (
+                    author.first_name,
+                    author.middle_name,
+                    author.last_name,
+                ) if name
+            ) if author else '',
+            'section': article.section.name if article.section else '',
+        })
+    return rows, next_cursor
+
+
+@functools.lru_cache(maxsize=None)
+def substring_author_search():
+    """
+    Whether the author search can match anywhere in a name. Only true on
+    PostgreSQL with the trigram indexes from migration 0003, elsewhere the
+    search matches the start of each name or email so that the prefix
+    indexes from migration 0006 serve it.
+    :return: bool
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_indexes WHERE indexname = %s',
+            ['bc_account_last_name_trgm'],
+        )
+        return cursor.fetchone() is not None
+
+
+def author_search_filter(term):
+    """
+    Builds a filter matching accounts whose names or email match every word
+    of a search term, as a substring or a prefix depending on
+    substring_author_search.
+    :param term: search string
+    :return: Q object
+    """
+    lookup = 'icontains' if substring_author_search() else 'istartswith'
+    query = Q()
+    for word in term.split():
+        query &= (
+            Q(**{'first_name__{0}'.format(lookup): word})
+            | Q(**{'last_name__{0}'.format(lookup): word})
+            | Q(**{'email__{0}'.format(lookup): word})
+        )
+    return query
+
+
+def available_authors(accounts, article, term=''):
+    """
+    Narrows an account queryset to those matching a search term that are
+    not already authors of an article. Current authors are excluded with
+    a NOT EXISTS subquery rather than a list of primary keys.
+    :param accounts: Account queryset
+    :param article: Article object
+    :param term: search string
+    :return: Account queryset
+    """
+    if term:
+        accounts = accounts.filter(author_search_filter(term))
+    return accounts.exclude(
+        Exists(article.authors.filter(pk=OuterRef('pk'))),
+    )
+
+
+def load_authors_and_credits(article):
+    """
+    Loads an article's frozen authors with their linked accounts and CRediT
+    records in two queries, in the same shape as
+    Article.authors_and_credits.
+    :param article: Article object
+    :return: OrderedDict of FrozenAuthor to list of CreditRecords
+    """
+    frozen_authors = models.FrozenAuthor.objects.filter(
+        article=article,
+    ).select_related(
+        'author',
+    ).order_by(
+        'order',
+    )
+    credits = {}
+    for record in models.CreditRecord.objects.filter(frozen_author__article=article):
+        credits.setdefault(record.frozen_author_id, []).append(record)
+
+    return collections.OrderedDict(
+        (author, credits.get(author.pk, [])) for author in frozen_authors
+    )
 
 
 def return_url(article, section=None):
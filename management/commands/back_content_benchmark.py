@@ -0,0 +1,193 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from plugins.back_content import benchmarks
+
+
+class Command(BaseCommand):
+    """Benchmarks parts of the back content import path."""
+
+    help = "Benchmarks parts of the back content import path."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--suite',
+            choices=('meta', 'authors', 'import', 'startup'),
+            default='meta',
+            help='Which benchmark to run.',
+        )
+        parser.add_argument(
+            '--pages',
+            nargs='*',
+            default=[],
+            help='Saved landing pages to parse. A synthetic page is used '
+                 'when none are given.',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--accounts',
+            type=int,
+            default=100000,
+            help='Number of accounts to seed for the authors suite.',
+        )
+        parser.add_argument(
+            '--article',
+            type=int,
+            default=None,
+            help='Article to search authors for, defaults to the latest.',
+        )
+        parser.add_argument(
+            '--journal',
+            default=None,
+            help='Journal code to import into for the import suite. A '
+                 'throwaway journal is created when not given.',
+        )
+        parser.add_argument(
+            '--dois',
+            type=int,
+            default=50,
+            help='Number of synthetic DOIs to import for the import suite.',
+        )
+        parser.add_argument(
+            '--fixtures',
+            default=None,
+            help='Directory of recorded Crossref responses, one JSON file '
+                 'per DOI. Synthetic records are used when not given.',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=None,
+            help='Results file to compare against; the command fails when '
+                 'a result regresses past the tolerance.',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            default=None,
+            help='Write the results to this file.',
+        )
+        parser.add_argument(
+            '--max-ms',
+            type=float,
+            default=benchmarks.STARTUP_MAX_MS,
+            help='Fail the startup suite when importing the plugin takes '
+                 'longer than this.',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Allowed regression as a fraction of the baseline.',
+        )
+
+    def handle(self, *args, **options):
+        if options['suite'] == 'authors':
+            return self.handle_authors(**options)
+        if options['suite'] == 'import':
+            return self.handle_import(**options)
+        if options['suite'] == 'startup':
+            return self.handle_startup(**options)
+
+        pages = []
+        for path in options['pages']:
+            with open(path, encoding='utf-8', errors='replace') as page_file:
+                pages.append(page_file.read())
+        if not pages:
+            pages = [benchmarks.synthetic_landing_page()]
+
+        results = benchmarks.bench_meta_extraction(pages, options['repeat'])
+        self.print_results(results)
+
+    def handle_authors(self, **options):
+        from submission.models import Article
+
+        if options['article']:
+            article = Article.objects.get(pk=options['article'])
+        else:
+            article = Article.objects.latest('pk')
+
+        results = benchmarks.bench_author_search(
+            article,
+            count=options['accounts'],
+            repeat=options['repeat'],
+        )
+        self.print_results(results)
+
+    def handle_import(self, **options):
+        from journal.models import Journal
+
+        journal = None
+        if options['journal']:
+            journal = Journal.objects.get(code=options['journal'])
+
+        records = None
+        if options['fixtures']:
+            records = benchmarks.load_crossref_fixtures(options['fixtures'])
+
+        pages = []
+        for path in options['pages']:
+            with open(path, encoding='utf-8', errors='replace') as page_file:
+                pages.append(page_file.read())
+
+        results = benchmarks.bench_import_pipeline(
+            journal,
+            count=options['dois'],
+            records=records,
+            pages=pages,
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                '{name:<24} n={n:<5} {throughput:8.2f}/s p50={p50:9.2f}ms '
+                'p95={p95:9.2f}ms queries={queries:6.1f} '
+                'max_queries={max_queries}'.format(name=name, **result)
+            )
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as baseline_file:
+                json.dump(results, baseline_file, indent=2)
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = benchmarks.compare_to_baseline(
+                results,
+                baseline,
+                options['tolerance'],
+            )
+            if regressions:
+                raise CommandError(
+                    'Benchmark regressed:\n{0}'.format('\n'.join(regressions)),
+                )
+
+    def handle_startup(self, **options):
+        result = benchmarks.bench_import_time(repeat=options['repeat'])
+        self.stdout.write(
+            'Plugin import time: {startup_ms:.1f}ms over {modules} modules '
+            '(median of {repeat} runs).'.format(repeat=options['repeat'], **result)
+        )
+        for name, us in result['slowest']:
+            self.stdout.write('{0:<48} {1:8.2f}ms'.format(name, us / 1000))
+
+        if result['deferred']:
+            raise CommandError(
+                'Deferred modules were imported at startup: {0}'.format(
+                    ', '.join(result['deferred']),
+                )
+            )
+        if result['startup_ms'] > options['max_ms']:
+            raise CommandError(
+                'Plugin import time {0:.1f}ms is over {1:.1f}ms.'.format(
+                    result['startup_ms'],
+                    options['max_ms'],
+                )
+            )
+
+    def print_results(self, results):
+        for name, result in results.items():
+            self.stdout.write(
+                '{name:<24} n={n:<5} mean={mean:9.2f}ms p50={p50:9.2f}ms '
+                'p95={p95:9.2f}ms peak={peak_kb:10.1f}KB'.format(
+                    name=name,
+                    **result,
+                )
+            )
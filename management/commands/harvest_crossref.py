@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from plugins.back_content import harvest
+
+
+class Command(BaseCommand):
+    """Imports a journal's works from Crossref by ISSN."""
+
+    help = "Imports a journal's works from Crossref by ISSN."
+
+    def add_arguments(self, parser):
+        parser.add_argument('journal_code')
+        parser.add_argument(
+            '--issn',
+            default=None,
+            help="ISSN to harvest, defaults to the journal's ISSN.",
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Ignore the saved high water mark and harvest every work.',
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=500,
+            help='Works per Crossref page, at most 1000.',
+        )
+
+    def handle(self, *args, **options):
+        from journal.models import Journal
+
+        try:
+            journal = Journal.objects.get(code=options['journal_code'])
+        except Journal.DoesNotExist:
+            raise CommandError('No journal with code {0}.'.format(options['journal_code']))
+
+        issn = options['issn'] or journal.issn
+        if not issn:
+            raise CommandError('The journal has no ISSN, pass one with --issn.')
+
+        def report(page):
+            self.stdout.write(
+                '{fetched} fetched, {skipped} already imported, {imported} '
+                'imported, {failed} failed.'.format(**page)
+            )
+
+        totals = harvest.harvest_journal(
+            journal,
+            issn,
+            full=options['full'],
+            rows=min(options['rows'], 1000),
+            on_page=report,
+        )
+        self.stdout.write(
+            'Harvest of {issn} finished: {fetched} fetched, {skipped} already '
+            'imported, {imported} imported, {failed} failed, {retried} earlier '
+            'failures imported, {failing} DOIs still failing.'.format(issn=issn, **totals)
+        )
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from plugins.back_content import jobs
+
+
+class Command(BaseCommand):
+    """Runs queued back content import jobs."""
+
+    help = "Runs queued back content import jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new jobs instead of exiting when the '
+                 'queue is empty.',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=int,
+            default=5,
+            help='Seconds to wait between polls when looping.',
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            default=None,
+            help='Exit after running this many jobs.',
+        )
+
+    def handle(self, *args, **options):
+        max_jobs = options['max_jobs']
+        ran = 0
+        while True:
+            remaining = None if max_jobs is None else max_jobs - ran
+            try:
+                count = jobs.drain_queue(max_jobs=remaining)
+            except Exception as e:
+                if not options['loop']:
+                    raise
+                self.stderr.write('Could not run jobs: {0}'.format(e))
+                count = 0
+            if count:
+                self.stdout.write('Ran {0} job(s).'.format(count))
+            ran += count
+            if not options['loop'] or (max_jobs is not None and ran >= max_jobs):
+                break
+            time.sleep(options['sleep'])
@@ -0,0 +1,230 @@
+import asyncio
+import contextlib
+import functools
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+PROFILING_ENABLED = getattr(settings, 'BACK_CONTENT_PROFILING_ENABLED', False)
+PROFILE_DIR = getattr(
+    settings,
+    'BACK_CONTENT_PROFILE_DIR',
+    os.path.join(settings.BASE_DIR, 'files', 'back_content', 'profiles'),
+)
+
+_lock = threading.Lock()
+_stages = {}
+
+
+class QueryCounter(object):
+    """
+    Context manager that counts the database queries run inside it.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class StageMetrics(object):
+    def __init__(self):
+        self.seconds = Histogram(TIME_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.bytes = 0
+        self.errors = 0
+
+
+def _get_stage(name):
+    if name not in _stages:
+        _stages[name] = StageMetrics()
+    return _stages[name]
+
+
+def record(name, seconds=None, queries=None, bytes_transferred=0, error=False):
+    """
+    Records one observation of a stage.
+    """
+    with _lock:
+        metrics = _get_stage(name)
+        if seconds is not None:
+            metrics.seconds.observe(seconds)
+        if queries is not None:
+            metrics.queries.observe(queries)
+        metrics.bytes += bytes_transferred
+        if error:
+            metrics.errors += 1
+
+
+def add_bytes(name, bytes_transferred):
+    record(name, bytes_transferred=bytes_transferred)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Records the wall time and number of queries of the code it wraps.
+    """
+    start = time.perf_counter()
+    error = False
+    with QueryCounter() as counter:
+        try:
+            yield counter
+        except Exception:
+            error = True
+            raise
+        finally:
+            record(
+                name,
+                seconds=time.perf_counter() - start,
+                queries=counter.count,
+                error=error,
+            )
+
+
+def instrument(name):
+    """
+    Decorator that records a function call as a stage.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_view(name):
+    """
+    Decorator that records a view as a stage. When profiling is enabled in
+    settings, staff can add ?bc_profile=1 to a request to save a cProfile
+    dump of the view to BACK_CONTENT_PROFILE_DIR. Async views only record
+    wall time, as their queries run in other threads.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                start = time.perf_counter()
+                error = False
+                try:
+                    return await view(request, *args, **kwargs)
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    record(
+                        'view.{0}'.format(name),
+                        seconds=time.perf_counter() - start,
+                        error=error,
+                    )
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with stage('view.{0}'.format(name)):
+                if (
+                    PROFILING_ENABLED
+                    and request.GET.get('bc_profile')
+                    and request.user.is_staff
+                ):
+                    return profile_view(name, view, request, *args, **kwargs)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def profile_view(name, view, request, *args, **kwargs):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(view, request, *args, **kwargs)
+    finally:
+        profiler.dump_stats(
+            os.path.join(
+                PROFILE_DIR,
+                '{0}-{1}.prof'.format(
+                    name,
+                    timezone.now().strftime('%Y%m%d%H%M%S%f'),
+                ),
+            )
+        )
+
+
+def prometheus_text():
+    """
+    Renders the metrics collected by this process in the Prometheus text
+    exposition format.
+    :return: string
+    """
+    lines = []
+    with _lock:
+        stages = sorted(_stages.items())
+        for metric, attr in (
+            ('back_content_stage_seconds', 'seconds'),
+            ('back_content_stage_queries', 'queries'),
+        ):
+            lines.append('# TYPE {0} histogram'.format(metric))
+            for name, metrics in stages:
+                histogram = getattr(metrics, attr)
+                if not histogram.count:
+                    continue
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(
+                        '{0}_bucket{{stage="{1}",le="{2}"}} {3}'.format(
+                            metric, name, bound, count,
+                        )
+                    )
+                lines.append(
+                    '{0}_bucket{{stage="{1}",le="+Inf"}} {2}'.format(
+                        metric, name, histogram.count,
+                    )
+                )
+                lines.append('{0}_sum{{stage="{1}"}} {2}'.format(metric, name, histogram.sum))
+                lines.append('{0}_count{{stage="{1}"}} {2}'.format(metric, name, histogram.count))
+
+        lines.append('# TYPE back_content_stage_bytes_total counter')
+        for name, metrics in stages:
+            lines.append(
+                'back_content_stage_bytes_total{{stage="{0}"}} {1}'.format(name, metrics.bytes)
+            )
+        lines.append('# TYPE back_content_stage_errors_total counter')
+        for name, metrics in stages:
+            lines.append(
+                'back_content_stage_errors_total{{stage="{0}"}} {1}'.format(name, metrics.errors)
+            )
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back_content', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importjob',
+            name='kind',
+            field=models.CharField(choices=[('doi', 'DOI Import'), ('url', 'URL Import'), ('preview', 'XML Preview Rendering')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,92 @@
+from django.db import migrations, transaction
+
+
+TRIGRAM_INDEXES = (
+    ('bc_account_first_name_trgm', 'first_name'),
+    ('bc_account_last_name_trgm', 'last_name'),
+    ('bc_account_email_trgm', 'email'),
+)
+PREFIX_INDEXES = (
+    ('bc_account_first_name_idx', 'first_name'),
+    ('bc_account_last_name_idx', 'last_name'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    """
+    Adds indexes to the accounts table for the author search. PostgreSQL
+    gets trigram indexes on the upper-cased columns, which serve the
+    UPPER(...) LIKE queries Django uses for icontains. If pg_trgm can't be
+    installed, or on other databases, plain indexes are added for prefix
+    searches.
+    """
+    connection = schema_editor.connection
+    table = apps.get_model('core', 'Account')._meta.db_table
+
+    if connection.vendor == 'postgresql':
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except Exception:
+            pass
+        else:
+            for name, column in TRIGRAM_INDEXES:
+                schema_editor.execute(
+                    'CREATE INDEX IF NOT EXISTS {0} ON {1} '
+                    'USING gin (UPPER({2}::text) gin_trgm_ops)'.format(
+                        name,
+                        schema_editor.quote_name(table),
+                        schema_editor.quote_name(column),
+                    )
+                )
+            return
+
+    if connection.vendor in {'postgresql', 'sqlite'}:
+        for name, column in PREFIX_INDEXES:
+            schema_editor.execute(
+                'CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})'.format(
+                    name,
+                    schema_editor.quote_name(table),
+                    schema_editor.quote_name(column),
+                )
+            )
+    else:
+        for name, column in PREFIX_INDEXES:
+            schema_editor.execute(
+                'CREATE INDEX {0} ON {1} ({2})'.format(
+                    name,
+                    schema_editor.quote_name(table),
+                    schema_editor.quote_name(column),
+                )
+            )
+
+
+def drop_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    table = apps.get_model('core', 'Account')._meta.db_table
+    for name, _column in TRIGRAM_INDEXES + PREFIX_INDEXES:
+        if connection.vendor in {'postgresql', 'sqlite'}:
+            schema_editor.execute('DROP INDEX IF EXISTS {0}'.format(name))
+        else:
+            try:
+                with transaction.atomic(using=connection.alias):
+                    schema_editor.execute(
+                        'DROP INDEX {0} ON {1}'.format(
+                            name,
+                            schema_editor.quote_name(table),
+                        )
+                    )
+            except Exception:
+                pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back_content', '0002_importjob_preview_kind'),
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
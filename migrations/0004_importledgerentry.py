@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0001_initial'),
+        ('submission', '0001_initial'),
+        ('back_content', '0003_account_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportLedgerEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_key', models.CharField(max_length=64)),
+                ('source_key', models.TextField()),
+                ('key_hash', models.CharField(max_length=64)),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('article', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='submission.article')),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='journal.journal')),
+            ],
+            options={
+                'verbose_name_plural': 'import ledger entries',
+                'unique_together': {('batch_key', 'key_hash')},
+            },
+        ),
+    ]
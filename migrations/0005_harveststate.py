@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0001_initial'),
+        ('back_content', '0004_importledgerentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HarvestState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('issn', models.CharField(max_length=9)),
+                ('high_water_mark', models.DateTimeField(blank=True, null=True)),
+                ('harvested', models.PositiveIntegerField(default=0)),
+                ('last_run', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='journal.journal')),
+            ],
+            options={
+                'unique_together': {('journal', 'issn')},
+            },
+        ),
+    ]
@@ -0,0 +1,93 @@
+from django.db import migrations, transaction
+
+
+OLD_PREFIX_INDEXES = (
+    ('bc_account_first_name_idx', 'first_name'),
+    ('bc_account_last_name_idx', 'last_name'),
+)
+PREFIX_INDEXES = (
+    ('bc_account_first_name_prefix', 'first_name'),
+    ('bc_account_last_name_prefix', 'last_name'),
+    ('bc_account_email_prefix', 'email'),
+)
+TRIGRAM_INDEX = 'bc_account_last_name_trgm'
+
+
+def has_trigram_indexes(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_indexes WHERE indexname = %s',
+            [TRIGRAM_INDEX],
+        )
+        return cursor.fetchone() is not None
+
+
+def create_indexes(apps, schema_editor):
+    """
+    Replaces the plain prefix indexes from 0003 with ones the author search
+    lookups can use. Django's istartswith is UPPER(col::text) LIKE on
+    PostgreSQL, which needs an expression index with text_pattern_ops, and
+    a case-insensitive LIKE on SQLite, which needs a NOCASE index. MySQL's
+    default collations are case-insensitive, so plain indexes serve it.
+    PostgreSQL databases with the trigram indexes are left alone.
+    """
+    connection = schema_editor.connection
+    table = schema_editor.quote_name(apps.get_model('core', 'Account')._meta.db_table)
+
+    if connection.vendor == 'postgresql':
+        if has_trigram_indexes(schema_editor):
+            return
+        template = (
+            'CREATE INDEX IF NOT EXISTS {0} ON {1} '
+            '(UPPER({2}::text) text_pattern_ops)'
+        )
+    elif connection.vendor == 'sqlite':
+        template = 'CREATE INDEX IF NOT EXISTS {0} ON {1} ({2} COLLATE NOCASE)'
+    else:
+        template = 'CREATE INDEX {0} ON {1} ({2})'
+
+    drop(connection, schema_editor, table, OLD_PREFIX_INDEXES)
+    for name, column in PREFIX_INDEXES:
+        schema_editor.execute(
+            template.format(name, table, schema_editor.quote_name(column)),
+        )
+
+
+def drop(connection, schema_editor, table, indexes):
+    for name, _column in indexes:
+        if connection.vendor in {'postgresql', 'sqlite'}:
+            schema_editor.execute('DROP INDEX IF EXISTS {0}'.format(name))
+        else:
+            try:
+                with transaction.atomic(using=connection.alias):
+                    schema_editor.execute('DROP INDEX {0} ON {1}'.format(name, table))
+            except Exception:
+                pass
+
+
+def drop_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    table = schema_editor.quote_name(apps.get_model('core', 'Account')._meta.db_table)
+    if connection.vendor == 'postgresql' and has_trigram_indexes(schema_editor):
+        return
+
+    drop(connection, schema_editor, table, PREFIX_INDEXES)
+    for name, column in OLD_PREFIX_INDEXES:
+        schema_editor.execute(
+            'CREATE INDEX {0} ON {1} ({2})'.format(
+                name,
+                table,
+                schema_editor.quote_name(column),
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back_content', '0005_harveststate'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back_content', '0007_importjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='harveststate',
+            name='failed_dois',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
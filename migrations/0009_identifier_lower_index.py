@@ -0,0 +1,65 @@
+from django.db import migrations, transaction
+
+
+INDEX_NAME = 'bc_identifier_lower_idx'
+
+
+def create_index(apps, schema_editor):
+    """
+    Adds an index on LOWER(identifier) to Janeway's identifiers table for
+    DOIIndex.lookup. MySQL only supports expression indexes from 8.0.13,
+    so the index is skipped when it can't be created there.
+    """
+    connection = schema_editor.connection
+    table = schema_editor.quote_name(
+        apps.get_model('identifiers', 'Identifier')._meta.db_table,
+    )
+    column = schema_editor.quote_name('identifier')
+
+    if connection.vendor in {'postgresql', 'sqlite'}:
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS {0} ON {1} (LOWER({2}))'.format(
+                INDEX_NAME,
+                table,
+                column,
+            )
+        )
+    else:
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute(
+                    'CREATE INDEX {0} ON {1} ((LOWER({2})))'.format(
+                        INDEX_NAME,
+                        table,
+                        column,
+                    )
+                )
+        except Exception:
+            pass
+
+
+def drop_index(apps, schema_editor):
+    connection = schema_editor.connection
+    table = schema_editor.quote_name(
+        apps.get_model('identifiers', 'Identifier')._meta.db_table,
+    )
+    if connection.vendor in {'postgresql', 'sqlite'}:
+        schema_editor.execute('DROP INDEX IF EXISTS {0}'.format(INDEX_NAME))
+    else:
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute('DROP INDEX {0} ON {1}'.format(INDEX_NAME, table))
+        except Exception:
+            pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back_content', '0008_harveststate_failed_dois'),
+        ('identifiers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
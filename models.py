@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETE = 'complete'
+JOB_FAILED = 'failed'
+
+JOB_STATUS_CHOICES = (
+    (JOB_QUEUED, 'Queued'),
+    (JOB_RUNNING, 'Running'),
+    (JOB_COMPLETE, 'Complete'),
+    (JOB_FAILED, 'Failed'),
+)
+
+JOB_KIND_CHOICES = (
+    ('doi', 'DOI Import'),
+    ('url', 'URL Import'),
+    ('preview', 'XML Preview Rendering'),
+)
+
+
+class ImportJob(models.Model):
+    journal = models.ForeignKey(
+        'journal.Journal',
+        on_delete=models.CASCADE,
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+    kind = models.CharField(max_length=20, choices=JOB_KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=20,
+        choices=JOB_STATUS_CHOICES,
+        default=JOB_QUEUED,
+        db_index=True,
+    )
+    total = models.PositiveIntegerField(default=0)
+    progress = models.PositiveIntegerField(default=0)
+    results = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    date_created = models.DateTimeField(default=timezone.now)
+    date_started = models.DateTimeField(null=True, blank=True)
+    date_finished = models.DateTimeField(null=True, blank=True)
+    heartbeat = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Updated by the worker after each chunk of a running job.',
+    )
+
+    class Meta:
+        ordering = ('-date_created',)
+
+    def __str__(self):
+        return '{0} job #{1} ({2})'.format(
+            self.get_kind_display(),
+            self.pk,
+            self.get_status_display(),
+        )
+
+    @property
+    def is_finished(self):
+        return self.status in {JOB_COMPLETE, JOB_FAILED}
+
+    @property
+    def percent(self):
+        if not self.total:
+            return 100 if self.is_finished else 0
+        return int(self.progress * 100 / self.total)
+
+    def as_dict(self):
+        return {
+            'id': self.pk,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'percent': self.percent,
+            'finished': self.is_finished,
+            'error': self.error,
+            'results': self.results if self.is_finished else [],
+        }
+
+
+class ImportLedgerEntry(models.Model):
+    """
+    Records that an item of an import batch was committed, so rerunning the
+    batch skips it. Entries are written in the same transaction as the
+    article they point to.
+    """
+    journal = models.ForeignKey(
+        'journal.Journal',
+        on_delete=models.CASCADE,
+    )
+    batch_key = models.CharField(max_length=64)
+    source_key = models.TextField()
+    key_hash = models.CharField(max_length=64)
+    article = models.ForeignKey(
+        'submission.Article',
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+    date_created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('batch_key', 'key_hash')
+        verbose_name_plural = 'import ledger entries'
+
+    def __str__(self):
+        return '{0} in batch {1}'.format(self.source_key, self.batch_key)
+
+
+class HarvestState(models.Model):
+    """
+    The progress of Crossref harvests of a journal's ISSN. The high water
+    mark is the last update date of the records harvested so far, later
+    runs only ask Crossref for records updated since then. Works that
+    failed to import are kept in failed_dois, keyed by DOI with the error
+    and the number of attempts, so later runs can retry them.
+    """
+    journal = models.ForeignKey(
+        'journal.Journal',
+        on_delete=models.CASCADE,
+    )
+    issn = models.CharField(max_length=9)
+    high_water_mark = models.DateTimeField(null=True, blank=True)
+    harvested = models.PositiveIntegerField(default=0)
+    last_run = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    failed_dois = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        unique_together = ('journal', 'issn')
+
+    def __str__(self):
+        return 'Harvest of {0} for {1}'.format(self.issn, self.journal)
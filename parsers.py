@@ -0,0 +1,59 @@
+from html.parser import HTMLParser
+
+
+class CitationMetaParser(HTMLParser):
+    """
+    Collects <meta> tags from the head of an HTML document. Parsing is
+    finished once </head> or <body> is seen, so callers can stop feeding
+    the rest of the page.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta = {}
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'body':
+            self.done = True
+        elif tag == 'meta':
+            attrs = dict(attrs)
+            name = attrs.get('name') or attrs.get('property')
+            content = attrs.get('content')
+            if name and content is not None:
+                self.meta.setdefault(name.lower(), []).append(content.strip())
+
+    def handle_endtag(self, tag):
+        if tag == 'head':
+            self.done = True
+
+
+def extract_citation_meta(chunks):
+    """
+    Extracts meta tags from an HTML document in a single pass, stopping at
+    the end of <head>.
+    :param chunks: a string or an iterable of string chunks
+    :return: dict of lower-cased meta name to list of content values
+    """
+    if isinstance(chunks, str):
+        chunks = [chunks]
+
+    parser = CitationMetaParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.done:
+            break
+    parser.close()
+    return parser.meta
+
+
+def first_meta(meta, *names, default=''):
+    """
+    Returns the first value found for any of the given meta names.
+    """
+    for name in names:
+        values = meta.get(name)
+        if values and values[0]:
+            return values[0]
+    return default
@@ -0,0 +1,101 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.models import Galley
+
+
+PREVIEW_CACHE_TIMEOUT = getattr(
+    settings,
+    'BACK_CONTENT_PREVIEW_CACHE_TIMEOUT',
+    60 * 60 * 24,
+)
+
+
+def file_checksum(file_obj):
+    """
+    Returns the SHA-256 of a galley's file. Checksums are cached against the
+    file's last modified time so replacing the file produces a new one.
+    :param file_obj: core File object
+    :return: hex digest string
+    """
+    key = 'back_content:checksum:{0}:{1}'.format(
+        file_obj.pk,
+        file_obj.last_modified.timestamp() if file_obj.last_modified else '',
+    )
+    checksum = cache.get(key)
+    if checksum is None:
+        digest = hashlib.sha256()
+        with open(file_obj.self_article_path(), 'rb') as galley_file:
+            for chunk in iter(lambda: galley_file.read(1024 * 1024), b''):
+                digest.update(chunk)
+        checksum = digest.hexdigest()
+        cache.set(key, checksum, PREVIEW_CACHE_TIMEOUT)
+    return checksum
+
+
+def preview_cache_key(galley):
+    """
+    Builds the cache key for a galley's rendered HTML from the galley file's
+    checksum and the XSL file used to transform it.
+    """
+    xsl_file = galley.xsl_file
+    xsl_version = '{0}:{1}'.format(
+        xsl_file.pk,
+        xsl_file.date_uploaded.timestamp() if xsl_file.date_uploaded else '',
+    ) if xsl_file else 'default'
+    return 'back_content:preview:{0}:{1}:{2}'.format(
+        galley.pk,
+        file_checksum(galley.file),
+        xsl_version,
+    )
+
+
+def render_preview(article, galleys):
+    """
+    Returns the rendered HTML of an XML galley, transforming it only when
+    there is no cached copy for the current file and XSL file.
+    :param article: Article object
+    :param galleys: Galley queryset containing the galley to render
+    :return: HTML string
+    """
+    from journal.logic import get_galley_content
+
+    galley = galleys[0]
+    key = preview_cache_key(galley)
+    content = cache.get(key)
+    if content is None:
+        content = get_galley_content(article, galleys)
+        cache.set(key, content, PREVIEW_CACHE_TIMEOUT)
+    return content
+
+
+def is_xml_galley(galley):
+    return galley.file and '/xml' in (galley.file.mime_type or '')
+
+
+def warm_previews(galley_ids):
+    """
+    Renders and caches the previews of a list of XML galleys.
+    :param galley_ids: list of Galley pks
+    :return: list of dicts with galley id and error
+    """
+    results = []
+    for galley_id in galley_ids:
+        error = None
+        galleys = Galley.objects.filter(
+            pk=galley_id,
+            file__mime_type__contains='/xml',
+        ).select_related(
+            'article',
+            'file',
+            'xsl_file',
+        )
+        try:
+            if galleys:
+                render_preview(galleys[0].article, galleys)
+        except Exception as e:
+            error = '{0}: {1}'.format(type(e).__name__, e)
+        results.append({'key': galley_id, 'article_id': None, 'error': error})
+    return results
@@ -0,0 +1,571 @@
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlencode, urlsplit
+
+from django.conf import settings
+
+from plugins.back_content import metrics
+
+
+CROSSREF_API = getattr(
+    settings,
+    'BACK_CONTENT_CROSSREF_API',
+    'https://api.crossref.org/v1',
+)
+FETCH_WORKERS = getattr(settings, 'BACK_CONTENT_FETCH_WORKERS', 8)
+HTTP_CACHE_DIR = getattr(
+    settings,
+    'BACK_CONTENT_HTTP_CACHE_DIR',
+    os.path.join(settings.BASE_DIR, 'files', 'back_content', 'http_cache'),
+)
+HTTP_CACHE_TTL = getattr(settings, 'BACK_CONTENT_HTTP_CACHE_TTL', 60 * 60 * 24 * 7)
+HTTP_CACHE_MAX_BYTES = getattr(
+    settings,
+    'BACK_CONTENT_HTTP_CACHE_MAX_BYTES',
+    256 * 1024 * 1024,
+)
+
+HTTP_TIMEOUT = getattr(settings, 'BACK_CONTENT_HTTP_TIMEOUT', (5, 30))
+HTTP_RETRIES = getattr(settings, 'BACK_CONTENT_HTTP_RETRIES', 4)
+HTTP_BACKOFF = getattr(settings, 'BACK_CONTENT_HTTP_BACKOFF', 0.5)
+HTTP_BACKOFF_MAX = getattr(settings, 'BACK_CONTENT_HTTP_BACKOFF_MAX', 60)
+HTTP_RATE_LIMIT = getattr(settings, 'BACK_CONTENT_HTTP_RATE_LIMIT', 10)
+HTTP_RATE_PENALTY = getattr(settings, 'BACK_CONTENT_HTTP_RATE_PENALTY', 60)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_local = threading.local()
+
+
+def get_session():
+    """
+    Returns a requests Session for the current thread with a connection pool
+    sized to the fetch worker count, so concurrent fetches reuse connections.
+    :return: requests.Session
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=FETCH_WORKERS,
+            pool_maxsize=FETCH_WORKERS,
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _local.session = session
+    return session
+
+
+class TokenBucket(object):
+    """
+    Allows rate requests per second on average, with bursts of up to
+    capacity requests.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.penalty_until = 0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate,
+        )
+        self.updated = now
+
+    def set_rate(self, rate, capacity=None):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = capacity or rate
+            self.tokens = min(self.tokens, self.capacity)
+
+    def take(self):
+        """
+        Takes a token if one is available.
+        :return: 0 when a token was taken, otherwise the seconds until one
+        will be available
+        """
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """
+        Blocks until a token is available and takes it.
+        :return: seconds spent waiting
+        """
+        waited = 0
+        delay = self.take()
+        while delay:
+            time.sleep(delay)
+            waited += delay
+            delay = self.take()
+        return waited
+
+
+def parse_interval(interval):
+    """
+    Parses a Crossref X-Rate-Limit-Interval header, eg. '1s'.
+    :return: seconds or None
+    """
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*$', interval or '')
+    if not match:
+        return None
+    multiplier = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[match.group(2) or 's']
+    return float(match.group(1)) * multiplier
+
+
+class RateLimiter(object):
+    """
+    Keeps a token bucket per host. Buckets start at HTTP_RATE_LIMIT requests
+    a second, follow the X-Rate-Limit-Limit and X-Rate-Limit-Interval
+    headers that Crossref sends, and are halved when a host answers 429.
+    After a 429 the headers can lower the rate but not raise it until
+    HTTP_RATE_PENALTY seconds, or any longer Retry-After, have passed.
+    """
+    def __init__(self, default_rate):
+        self.default_rate = default_rate
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.default_rate)
+            return self.buckets[host]
+
+    def wait(self, url):
+        return self.bucket(url).acquire()
+
+    def update(self, url, response):
+        bucket = self.bucket(url)
+        if response.status_code == 429:
+            bucket.set_rate(max(bucket.rate / 2, 0.1), max(bucket.capacity / 2, 1))
+            bucket.penalty_until = time.monotonic() + max(
+                HTTP_RATE_PENALTY,
+                retry_after(response) or 0,
+            )
+            return
+
+        limit = response.headers.get('X-Rate-Limit-Limit', '')
+        interval = parse_interval(response.headers.get('X-Rate-Limit-Interval'))
+        if limit.isdigit() and int(limit) and interval:
+            rate = int(limit) / interval
+            if time.monotonic() < bucket.penalty_until and rate >= bucket.rate:
+                return
+            if rate != bucket.rate:
+                bucket.set_rate(rate, int(limit))
+
+
+rate_limiter = RateLimiter(HTTP_RATE_LIMIT)
+
+
+def retry_after(response):
+    """
+    Reads a Retry-After header given in seconds or as an HTTP date.
+    :return: seconds or None
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return int(value)
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt):
+    """
+    Exponential backoff with full jitter.
+    """
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF * 2 ** attempt))
+
+
+def fetch(url, headers=None, stream=False):
+    """
+    GETs a URL through the per-host rate limiter with hard timeouts.
+    Connection errors, timeouts, 429s and 5xx responses are retried with
+    jittered exponential backoff, waiting at least as long as any
+    Retry-After header asks.
+    :param url: URL to fetch
+    :param headers: dict of request headers
+    :param stream: passed to requests
+    :return: requests Response, the last one received when retries run out
+    """
+    import requests
+
+    attempt = 0
+    while True:
+        rate_limiter.wait(url)
+        try:
+            r = get_session().get(
+                url,
+                headers=headers,
+                stream=stream,
+                timeout=HTTP_TIMEOUT,
+            )
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= HTTP_RETRIES:
+                raise
+            delay = backoff(attempt)
+        else:
+            rate_limiter.update(url, r)
+            if r.status_code not in RETRY_STATUSES or attempt >= HTTP_RETRIES:
+                return r
+            delay = max(backoff(attempt), retry_after(r) or 0)
+            r.close()
+
+        delay = min(delay, HTTP_BACKOFF_MAX)
+        metrics.record('http.retry', seconds=delay)
+        time.sleep(delay)
+        attempt += 1
+
+
+class CachedResponse(object):
+    """
+    The parts of a requests Response that the import code uses, built either
+    from a live response or from a cache entry.
+    """
+    def __init__(self, url, status_code, text, headers=None, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+        self.from_cache = from_cache
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        import requests
+
+        if not self.ok:
+            raise requests.HTTPError(
+                '{0} error for url: {1}'.format(self.status_code, self.url),
+            )
+
+
+class ResponseCache(object):
+    """
+    A size-bounded on-disk cache of response bodies. Entries are JSON files
+    named after a hash of their key; reads bump the file mtime so eviction
+    removes the least recently used entries first.
+    """
+    def __init__(self, directory, ttl, max_bytes):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], '{0}.json'.format(digest))
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as cache_file:
+                entry = json.load(cache_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get('fetched', 0) < self.ttl
+
+    def set(self, key, entry):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(entry).encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat
+
+    def _disk_usage(self):
+        return sum(stat.st_size for _path, stat in self._entries())
+
+    def _evict(self):
+        """
+        Deletes least recently used entries until the cache is back under
+        90% of its size limit.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        size = sum(stat.st_size for _path, stat in entries)
+        target = self.max_bytes * 0.9
+        for path, stat in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= stat.st_size
+            self.stats['evictions'] += 1
+        self._size = size
+
+
+response_cache = ResponseCache(HTTP_CACHE_DIR, HTTP_CACHE_TTL, HTTP_CACHE_MAX_BYTES)
+
+
+def read_until(r, marker, chunk_size=16 * 1024):
+    """
+    Reads a streamed response until a marker is found, then closes the
+    connection without downloading the rest of the body.
+    :param r: requests Response opened with stream=True
+    :param marker: lower-case bytes to stop after, eg. b'</head>'
+    :return: decoded text read so far
+    """
+    data = bytearray()
+    try:
+        for chunk in r.iter_content(chunk_size=chunk_size):
+            search_from = max(0, len(data) - len(marker))
+            data.extend(chunk)
+            if bytes(data[search_from:]).lower().find(marker) != -1:
+                break
+    finally:
+        r.close()
+
+    encoding = 'utf-8'
+    if 'charset' in r.headers.get('Content-Type', '') and r.encoding:
+        encoding = r.encoding
+    return data.decode(encoding, errors='replace')
+
+
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Content-Type')
+
+
+def cache_lookup(key):
+    """
+    Looks a key up in the response cache.
+    :param key: cache key
+    :return: tuple of the cache entry, a CachedResponse when the entry is
+    fresh, and the conditional request headers to revalidate a stale entry
+    """
+    entry = response_cache.get(key)
+    if entry and response_cache.is_fresh(entry):
+        response_cache.count('hits')
+        return entry, CachedResponse(entry['url'], 200, entry['text'], entry['headers'], True), {}
+
+    headers = {}
+    if entry:
+        if entry['headers'].get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        elif entry.get('fetched'):
+            headers['If-Modified-Since'] = formatdate(entry['fetched'], usegmt=True)
+    return entry, None, headers
+
+
+def cache_revalidated(key, entry, start):
+    """
+    Refreshes an entry after a 304 response.
+    :return: CachedResponse
+    """
+    metrics.record('http.fetch', seconds=time.perf_counter() - start)
+    response_cache.count('revalidated')
+    entry['fetched'] = time.time()
+    response_cache.set(key, entry)
+    return CachedResponse(entry['url'], 200, entry['text'], entry['headers'], True)
+
+
+def cache_store(key, response, start):
+    """
+    Records a fetched response and caches it if it succeeded.
+    :param response: CachedResponse built from the live response
+    :return: the response
+    """
+    response_cache.count('misses')
+    metrics.record(
+        'http.fetch',
+        seconds=time.perf_counter() - start,
+        bytes_transferred=len(response.text.encode('utf-8')),
+    )
+    if response.status_code == 200:
+        response_cache.set(
+            key,
+            {
+                'url': response.url,
+                'text': response.text,
+                'headers': response.headers,
+                'fetched': time.time(),
+            },
+        )
+    return response
+
+
+def cached_get(url, key=None, stream_until=None):
+    """
+    GETs a URL through the response cache. Fresh entries are served without
+    a request, stale entries are revalidated with If-None-Match and
+    If-Modified-Since, and successful responses are stored.
+    :param url: URL to fetch
+    :param key: cache key, defaults to the URL
+    :param stream_until: lower-case bytes marker, when set only the body up
+    to the marker is downloaded and cached
+    :return: CachedResponse
+    """
+    key = key or url
+    entry, cached, headers = cache_lookup(key)
+    if cached:
+        return cached
+
+    start = time.perf_counter()
+    r = fetch(url, headers=headers, stream=bool(stream_until))
+
+    if entry and r.status_code == 304:
+        r.close()
+        return cache_revalidated(key, entry, start)
+
+    response = CachedResponse(
+        r.url,
+        r.status_code,
+        read_until(r, stream_until) if stream_until else r.text,
+        {name: r.headers[name] for name in CACHED_HEADERS if name in r.headers},
+    )
+    return cache_store(key, response, start)
+
+
+def crossref_cache_key(doi):
+    return 'doi:{0}'.format(doi.lower())
+
+
+def crossref_work_url(doi):
+    return '{0}/works/{1}'.format(CROSSREF_API.rstrip('/'), doi)
+
+
+def fetch_crossref_work(doi):
+    """
+    Fetches a single Crossref work record.
+    :param doi: DOI string
+    :return: the decoded JSON record
+    """
+    r = cached_get(crossref_work_url(doi), key=crossref_cache_key(doi))
+    r.raise_for_status()
+    return r.json()
+
+
+def fetch_url(url):
+    """
+    Fetches the <head> of a landing page, which is all that is needed to
+    read its citation meta tags.
+    :param url: URL string
+    :return: CachedResponse
+    """
+    r = cached_get(url, stream_until=b'</head>')
+    r.raise_for_status()
+    return r
+
+
+def iter_journal_works(issn, from_update_date=None, rows=500):
+    """
+    Pages through a journal's works on Crossref with a deep paging cursor,
+    oldest update first, yielding each page as it arrives. Pages are not
+    cached.
+    :param issn: ISSN string
+    :param from_update_date: date, only works updated on or after it are
+    returned
+    :param rows: works per page, at most 1000
+    :return: generator of lists of work messages
+    """
+    params = {
+        'rows': rows,
+        'sort': 'updated',
+        'order': 'asc',
+        'cursor': '*',
+    }
+    if from_update_date:
+        params['filter'] = 'from-update-date:{0}'.format(from_update_date.isoformat())
+
+    url = '{0}/journals/{1}/works'.format(CROSSREF_API.rstrip('/'), quote(issn))
+    while True:
+        start = time.perf_counter()
+        r = fetch('{0}?{1}'.format(url, urlencode(params)))
+        r.raise_for_status()
+        message = r.json()['message']
+        metrics.record(
+            'http.harvest',
+            seconds=time.perf_counter() - start,
+            bytes_transferred=len(r.content),
+        )
+
+        items = message.get('items') or []
+        if not items:
+            return
+        yield items
+        if not message.get('next-cursor') or len(items) < rows:
+            return
+        params['cursor'] = message['next-cursor']
+
+
+def fetch_crossref_works(dois, workers=None):
+    """
+    Fetches Crossref records for a list of DOIs using a bounded thread pool.
+    :param dois: list of DOI strings
+    :param workers: max concurrent fetches, defaults to FETCH_WORKERS
+    :return: generator of (doi, record, error) tuples in input order
+    """
+    import requests
+
+    workers = workers or FETCH_WORKERS
+
+    def _fetch(doi):
+        try:
+            return doi, fetch_crossref_work(doi), None
+        except (requests.RequestException, ValueError) as e:
+            return doi, None, e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(_fetch, dois):
+            yield result
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.models import SettingValue
+from journal.models import Issue
+from submission.models import Section, Licence, Field, SubmissionConfiguration
+
+from plugins.back_content import journal_cache
+
+
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+@receiver(post_save, sender=Licence)
+@receiver(post_delete, sender=Licence)
+@receiver(post_save, sender=Issue)
+@receiver(post_delete, sender=Issue)
+@receiver(post_save, sender=Field)
+@receiver(post_delete, sender=Field)
+@receiver(post_save, sender=SettingValue)
+@receiver(post_delete, sender=SettingValue)
+@receiver(post_save, sender=SubmissionConfiguration)
+@receiver(post_delete, sender=SubmissionConfiguration)
+def invalidate_journal_config(sender, instance, **kwargs):
+    journal_cache.invalidate(getattr(instance, 'journal_id', None))
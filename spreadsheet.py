@@ -0,0 +1,209 @@
+import csv
+import io
+import itertools
+
+from django.db import transaction
+
+from submission import models
+from identifiers import models as ident_models
+from plugins.back_content import journal_cache, logic
+from plugins.back_content.forms import ArticleInfo
+
+
+SPREADSHEET_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_rows(uploaded_file):
+    """
+    Streams rows from an uploaded CSV or TSV file without reading it all
+    into memory. The delimiter is taken from the header line.
+    :param uploaded_file: Django UploadedFile
+    :return: generator of (line number, row dict) tuples
+    """
+    text = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+    try:
+        header = text.readline()
+        delimiter = '\t' if header.count('\t') > header.count(',') else ','
+        reader = csv.DictReader(
+            itertools.chain([header], text),
+            delimiter=delimiter,
+        )
+        for row in reader:
+            yield reader.line_num, {
+                (key or '').strip(): (value or '').strip()
+                for key, value in row.items()
+            }
+    finally:
+        text.detach()
+
+
+class SpreadsheetImporter(object):
+    """
+    Creates articles from spreadsheet rows. Each row is validated with the
+    ArticleInfo form so the journal's submission configuration and
+    additional fields apply, then valid rows are inserted in chunks with
+    bulk_create, one transaction per chunk.
+    """
+    def __init__(self, journal, owner, chunk_size=SPREADSHEET_CHUNK_SIZE):
+        self.journal = journal
+        self.owner = owner
+        self.chunk_size = chunk_size
+        config = journal_cache.get_journal_config(journal)
+        self.additional_fields = config['fields']
+        self.configuration = config['configuration']
+        self.sections = {
+            section.name.lower(): section.pk
+            for section in config['sections']
+            if section.name
+        }
+        self.licences = {}
+        for licence in config['licences']:
+            self.licences[licence.short_name.lower()] = licence.pk
+            self.licences[licence.name.lower()] = licence.pk
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def _form_data(self, row):
+        data = dict(row)
+        section = data.get('section', '')
+        if section and not section.isdigit():
+            data['section'] = self.sections.get(section.lower(), section)
+        licence = data.get('license', '')
+        if licence and not licence.isdigit():
+            data['license'] = self.licences.get(licence.lower(), licence)
+        return data
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def apply_defaults(self, article):
+        # Mirrors SubmissionConfiguration.handle_defaults without saving.
+        if not article.section_id and self.configuration.default_section_id:
+            article.section_id = self.configuration.default_section_id
+        if not article.license_id and self.configuration.default_license_id:
+            article.license_id = self.configuration.default_license_id
+        if not article.language and self.configuration.default_language:
+            article.language = self.configuration.default_language
+
+    def run(self, rows):
+        """
+        :param rows: iterable of (line number, row dict) tuples
+        """
+        chunk = []
+        for line, row in rows:
+            form = ArticleInfo(
+                self._form_data(row),
+                additional_fields=self.additional_fields,
+                journal=self.journal,
+            )
+            if not form.is_valid():
+                self.add_error(
+                    line,
+                    {
+                        field: ' '.join(errors)
+                        for field, errors in form.errors.items()
+                    },
+                )
+                continue
+
+            article = form.instance
+            article.journal = self.journal
+            article.owner = self.owner
+            self.apply_defaults(article)
+            chunk.append((line, article, form.cleaned_data, row.get('doi', '')))
+
+            if len(chunk) >= self.chunk_size:
+                self.save_chunk(chunk)
+                chunk = []
+
+        if chunk:
+            self.save_chunk(chunk)
+
+    def save_chunk(self, chunk):
+        try:
+            with transaction.atomic():
+                self._save_chunk(chunk)
+        except Exception as e:
+            for line, _article, _data, _doi in chunk:
+                self.add_error(line, {'__all__': logic.describe_error(e)})
+        else:
+            self.created += len(chunk)
+
+    def _save_chunk(self, chunk):
+        articles = logic.bulk_create_with_pks(
+            models.Article,
+            [article for _line, article, _data, _doi in chunk],
+        )
+
+        answers = []
+        identifiers = []
+        keywords = []
+        for article, (_line, _article, data, doi) in zip(articles, chunk):
+            for field in self.additional_fields:
+                answer = data.get(field.name)
+                if answer not in (None, ''):
+                    answers.append(
+                        models.FieldAnswer(
+                            field=field,
+                            article=article,
+                            answer=answer,
+                        )
+                    )
+            if doi:
+                identifiers.append(
+                    ident_models.Identifier(
+                        id_type='doi',
+                        identifier=logic.normalise_doi(doi),
+                        enabled=True,
+                        article=article,
+                    )
+                )
+            for order, word in enumerate(
+                word.strip() for word in data.get('keywords', '').split(',')
+            ):
+                if word:
+                    keywords.append((article, word, order))
+
+        models.FieldAnswer.objects.bulk_create(answers)
+        ident_models.Identifier.objects.bulk_create(identifiers)
+        self._save_keywords(keywords)
+
+    def _save_keywords(self, keywords):
+        if not keywords:
+            return
+        words = {word for _article, word, _order in keywords}
+        existing = {
+            keyword.word: keyword
+            for keyword in models.Keyword.objects.filter(word__in=words)
+        }
+        missing = [models.Keyword(word=word) for word in words if word not in existing]
+        for keyword in logic.bulk_create_with_pks(models.Keyword, missing):
+            existing[keyword.word] = keyword
+
+        models.KeywordArticle.objects.bulk_create(
+            [
+                models.KeywordArticle(
+                    article=article,
+                    keyword=existing[word],
+                    order=order,
+                ) for article, word, order in keywords
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def import_spreadsheet(uploaded_file, journal, owner):
+    """
+    Imports articles from an uploaded CSV or TSV file.
+    :param uploaded_file: Django UploadedFile
+    :param journal: Journal object
+    :param owner: Account object
+    :return: SpreadsheetImporter with created, error_count and errors
+    """
+    importer = SpreadsheetImporter(journal, owner)
+    importer.run(iter_rows(uploaded_file))
+    return importer
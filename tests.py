@@ -0,0 +1,584 @@
+import datetime
+import io
+import time
+from unittest import mock
+
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import models as core_models
+from identifiers import models as ident_models
+from submission import models as submission_models
+from utils.testing import helpers
+
+from plugins.back_content import (benchmarks,
+                                  forms,
+                                  harvest,
+                                  jats,
+                                  jobs,
+                                  journal_cache,
+                                  ledger,
+                                  logic,
+                                  models,
+                                  remote,
+                                  uploads)
+
+
+class TestArticleInfoQueries(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.journal, _journal_two = helpers.create_journals()
+
+    def make_article(self, field_count):
+        article = helpers.create_article(self.journal)
+        article.section = submission_models.Section.objects.filter(
+            journal=self.journal,
+        ).first()
+        article.save()
+        fields = []
+        for order in range(field_count):
+            field = submission_models.Field.objects.create(
+                journal=self.journal,
+                name='Field {0} {1}'.format(article.pk, order),
+                kind='text',
+                width='full',
+                order=order,
+                required=False,
+            )
+            if order % 2:
+                submission_models.FieldAnswer.objects.create(
+                    field=field,
+                    article=article,
+                    answer='old',
+                )
+            fields.append(field)
+        return article, fields
+
+    def count_queries(self, field_count):
+        article, fields = self.make_article(field_count)
+        journal_cache.invalidate(self.journal.pk)
+        with CaptureQueriesContext(connection) as context:
+            form = forms.ArticleInfo(
+                instance=article,
+                additional_fields=fields,
+            )
+        build = len(context.captured_queries)
+
+        data = {
+            name: value for name, value in (
+                (name, form[name].value()) for name in form.fields
+            ) if value is not None
+        }
+        data.update({field.name: 'new' for field in fields})
+        request = RequestFactory().post('/', data)
+        request.journal = self.journal
+
+        with CaptureQueriesContext(connection) as context:
+            form = forms.ArticleInfo(
+                data,
+                instance=article,
+                additional_fields=fields,
+            )
+            self.assertTrue(form.is_valid(), form.errors)
+            form.save(request=request)
+        save = len(context.captured_queries)
+
+        self.assertEqual(
+            submission_models.FieldAnswer.objects.filter(
+                article=article,
+                answer='new',
+            ).count(),
+            field_count,
+        )
+        return build, save
+
+    def test_query_count_is_constant(self):
+        self.assertEqual(self.count_queries(2), self.count_queries(20))
+
+
+class TestAddAuthorsQueries(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.journal, _journal_two = helpers.create_journals()
+        cls.role = submission_models.CreditRecord._meta.get_field('role').choices[0][0]
+
+    def make_article(self, author_count):
+        article = helpers.create_article(self.journal)
+        for order in range(author_count):
+            author = submission_models.FrozenAuthor.objects.create(
+                article=article,
+                first_name='Author',
+                last_name=str(order),
+                order=order,
+            )
+            submission_models.CreditRecord.objects.create(
+                frozen_author=author,
+                role=self.role,
+            )
+        return article
+
+    def count_queries(self, article):
+        with CaptureQueriesContext(connection) as context:
+            authors = forms.credit_forms(logic.load_authors_and_credits(article))
+            for author, credits, credit_form in authors:
+                str(author.author)
+                str(credit_form)
+        return len(context.captured_queries), authors
+
+    def test_credit_forms_query_count_is_constant(self):
+        few, few_authors = self.count_queries(self.make_article(2))
+        many, many_authors = self.count_queries(self.make_article(40))
+
+        self.assertEqual(len(few_authors), 2)
+        self.assertEqual(len(many_authors), 40)
+        self.assertEqual(few, many)
+
+    def test_credit_forms_skip_assigned_roles(self):
+        article = self.make_article(1)
+        author, credits, credit_form = forms.credit_forms(
+            logic.load_authors_and_credits(article),
+        )[0]
+
+        self.assertEqual(len(credits), 1)
+        self.assertIsNone(credit_form.prefix)
+        self.assertEqual(credit_form.instance.frozen_author_id, author.pk)
+        self.assertNotIn(
+            self.role,
+            [value for value, _label in credit_form.fields['role'].choices],
+        )
+
+
+class TestStartup(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.result = benchmarks.bench_import_time(repeat=3)
+
+    def test_deferred_modules_are_not_imported_at_startup(self):
+        self.assertEqual(self.result['deferred'], [])
+
+    def test_plugin_import_time_is_under_the_limit(self):
+        self.assertLess(self.result['startup_ms'], benchmarks.STARTUP_MAX_MS)
+
+
+class TestStaleJobs(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.journal, _journal_two = helpers.create_journals()
+
+    def make_running_job(self, started, heartbeat):
+        return models.ImportJob.objects.create(
+            kind='doi',
+            journal=self.journal,
+            status=models.JOB_RUNNING,
+            date_started=timezone.now() - datetime.timedelta(seconds=started),
+            heartbeat=timezone.now() - datetime.timedelta(seconds=heartbeat),
+        )
+
+    def test_job_with_recent_heartbeat_is_not_requeued(self):
+        job = self.make_running_job(jobs.JOB_TIMEOUT * 4, 1)
+        self.assertEqual(jobs.requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, models.JOB_RUNNING)
+
+    def test_job_without_heartbeat_is_requeued(self):
+        job = self.make_running_job(jobs.JOB_TIMEOUT * 4, jobs.JOB_TIMEOUT * 2)
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, models.JOB_QUEUED)
+        self.assertIsNone(job.heartbeat)
+
+
+class TestAuthorIndex(TestCase):
+
+    @staticmethod
+    def record(*authors):
+        return {
+            'message': {
+                'author': [
+                    {'given': given, 'family': family} for given, family in authors
+                ],
+            },
+        }
+
+    @staticmethod
+    def make_account(first_name, last_name):
+        return core_models.Account.objects.create(
+            username='{0}.{1}@example.org'.format(first_name, last_name),
+            email='{0}.{1}@example.org'.format(first_name, last_name),
+            first_name=first_name,
+            last_name=last_name,
+            institution='Example University',
+        )
+
+    def test_candidates_need_given_and_family_name(self):
+        ada = self.make_account('Ada', 'Wang')
+        self.make_account('Bo', 'Wang')
+
+        index = logic.AuthorIndex()
+        index.load([self.record(('ada', 'WANG'))])
+
+        self.assertEqual(
+            index.match(first_name='Ada', last_name='Wang', institution='Example University'),
+            ada,
+        )
+        self.assertIsNone(
+            index.match(first_name='Bo', last_name='Wang', institution='Example University'),
+        )
+
+    def test_candidates_load_in_bounded_queries(self):
+        authors = [
+            ('Given{0}'.format(i), 'Family{0}'.format(i))
+            for i in range(logic.AUTHOR_QUERY_CHUNK_SIZE * 2 + 1)
+        ]
+        with self.assertNumQueries(3):
+            logic.AuthorIndex().load([self.record(*authors)])
+
+
+class TestMatchFolders(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.journal, cls.other_journal = helpers.create_journals()
+
+    def make_article(self, doi, journal=None):
+        article = helpers.create_article(journal or self.journal)
+        ident_models.Identifier.objects.create(
+            id_type='doi',
+            identifier=doi,
+            article=article,
+            enabled=True,
+        )
+        return article
+
+    def test_matches_ids_and_normalised_dois(self):
+        mixed = self.make_article('10.1234/Mixed.Case')
+        prefixed = self.make_article('https://doi.org/10.1234/prefixed')
+        self.make_article('10.1234/other', journal=self.other_journal)
+
+        matched = uploads.match_folders(
+            self.journal,
+            [str(mixed.pk), '10.1234_MIXED.case', '10.1234_prefixed', '10.1234_other'],
+        )
+
+        self.assertEqual(
+            matched,
+            {
+                str(mixed.pk): mixed,
+                '10.1234_MIXED.case': mixed,
+                '10.1234_prefixed': prefixed,
+            },
+        )
+
+
+class TestImportLedger(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.journal, _journal_two = helpers.create_journals()
+
+    def import_batch(self, dois):
+        fetched = []
+
+        def fetch_crossref_works(batch, workers=None):
+            fetched.extend(batch)
+            return [
+                (doi, benchmarks.synthetic_crossref_record(doi), None) for doi in batch
+            ]
+
+        batch_ledger = ledger.Ledger(
+            self.journal,
+            ledger.batch_key(self.journal, 'doi', dois),
+        ).load()
+        with mock.patch.object(remote, 'fetch_crossref_works', fetch_crossref_works):
+            results = logic.import_dois(
+                dois,
+                self.journal,
+                ledger=batch_ledger,
+                doi_index=logic.DOIIndex(self.journal),
+            )
+        return results, fetched
+
+    def test_rerun_skips_committed_items(self):
+        dois = ['10.9999/ledger.{0}'.format(i) for i in range(3)]
+        first, fetched = self.import_batch(dois)
+        self.assertEqual(fetched, dois)
+        self.assertEqual([result['error'] for result in first], [None] * 3)
+
+        second, fetched = self.import_batch(dois)
+        self.assertEqual(fetched, [])
+        self.assertTrue(all(result['skipped'] for result in second))
+        self.assertEqual(
+            [result['article'].pk for result in second],
+            [result['article'].pk for result in first],
+        )
+
+    def test_item_whose_article_was_deleted_is_imported_again(self):
+        dois = ['10.9999/deleted.{0}'.format(i) for i in range(3)]
+        first, _fetched = self.import_batch(dois)
+        deleted_pk = first[0]['article'].pk
+        first[0]['article'].delete()
+
+        second, fetched = self.import_batch(dois)
+        self.assertEqual(fetched, [dois[0]])
+        self.assertFalse(second[0]['skipped'])
+        self.assertNotEqual(second[0]['article'].pk, deleted_pk)
+        self.assertTrue(all(result['skipped'] for result in second[1:]))
+        self.assertEqual(
+            models.ImportLedgerEntry.objects.filter(
+                batch_key=ledger.batch_key(self.journal, 'doi', dois),
+                article__isnull=False,
+            ).count(),
+            3,
+        )
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class TestRateLimiter(SimpleTestCase):
+
+    url = 'https://api.crossref.org/works'
+
+    @staticmethod
+    def limit_headers(limit):
+        return FakeResponse(
+            headers={'X-Rate-Limit-Limit': str(limit), 'X-Rate-Limit-Interval': '1s'},
+        )
+
+    def test_headers_set_the_rate(self):
+        limiter = remote.RateLimiter(10)
+        limiter.update(self.url, self.limit_headers(50))
+        self.assertEqual(limiter.bucket(self.url).rate, 50)
+
+    def test_429_halves_the_rate_and_holds_it(self):
+        limiter = remote.RateLimiter(10)
+        limiter.update(self.url, FakeResponse(429))
+        bucket = limiter.bucket(self.url)
+        self.assertEqual(bucket.rate, 5)
+        self.assertGreater(bucket.penalty_until, 0)
+
+        limiter.update(self.url, self.limit_headers(50))
+        self.assertEqual(bucket.rate, 5)
+
+        limiter.update(self.url, self.limit_headers(2))
+        self.assertEqual(bucket.rate, 2)
+
+    def test_rate_recovers_after_the_penalty(self):
+        limiter = remote.RateLimiter(10)
+        limiter.update(self.url, FakeResponse(429))
+        bucket = limiter.bucket(self.url)
+        bucket.penalty_until = 0
+
+        limiter.update(self.url, self.limit_headers(50))
+        self.assertEqual(bucket.rate, 50)
+
+    def test_retry_after_extends_the_penalty(self):
+        limiter = remote.RateLimiter(10)
+        limiter.update(
+            self.url,
+            FakeResponse(429, {'Retry-After': str(remote.HTTP_RATE_PENALTY * 10)}),
+        )
+        bucket = limiter.bucket(self.url)
+        self.assertGreater(
+            bucket.penalty_until - time.monotonic(),
+            remote.HTTP_RATE_PENALTY * 5,
+        )
+
+
+JATS_FRONT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<article xmlns:xlink="http://www.w3.org/1999/xlink">
+  <front>
+    <article-meta>
+      <article-id pub-id-type="doi">10.1234/jats.1</article-id>
+      <article-id pub-id-type="publisher-id">e42</article-id>
+      <title-group><article-title>A <italic>JATS</italic> title</article-title></title-group>
+      <contrib-group>
+        <contrib contrib-type="author">
+          <contrib-id contrib-id-type="orcid">https://orcid.org/0000-0002-1825-0097</contrib-id>
+          <name><surname>Carberry</surname><given-names>Josiah</given-names></name>
+          <email>josiah@example.org</email>
+          <xref ref-type="aff" rid="aff1"/>
+        </contrib>
+        <contrib contrib-type="editor">
+          <name><surname>Editor</surname><given-names>Ed</given-names></name>
+        </contrib>
+      </contrib-group>
+      <aff id="aff1"><label>1</label>Brown University, Providence</aff>
+      <pub-date pub-type="epub"><day>15</day><month>3</month><year>2019</year></pub-date>
+      <fpage>10</fpage><lpage>20</lpage>
+      <abstract><p>First &amp; only.</p></abstract>
+    </article-meta>
+  </front>
+"""
+
+
+class TestJATSFront(SimpleTestCase):
+
+    def test_extracts_front_metadata(self):
+        metadata = jats.extract_front_metadata(
+            io.BytesIO(JATS_FRONT + b'<body><p>Text</p></body></article>'),
+        )
+
+        self.assertEqual(metadata['title'], 'A JATS title')
+        self.assertEqual(metadata['abstract'], '<p>First &amp; only.</p>')
+        self.assertEqual(metadata['date_published'], datetime.datetime(2019, 3, 15))
+        self.assertEqual((metadata['first_page'], metadata['last_page']), (10, 20))
+        self.assertEqual(
+            metadata['identifiers'],
+            [('doi', '10.1234/jats.1'), ('pubid', 'e42')],
+        )
+        self.assertEqual(
+            metadata['authors'],
+            [{
+                'first_name': 'Josiah',
+                'last_name': 'Carberry',
+                'institution': 'Brown University, Providence',
+                'email': 'josiah@example.org',
+                'orcid': '0000-0002-1825-0097',
+            }],
+        )
+
+    def test_stops_reading_after_front(self):
+        body = b'<body>' + b'<p>Text</p>' * 100000 + b'</body><unclosed>'
+        metadata = jats.extract_front_metadata(io.BytesIO(JATS_FRONT + body))
+        self.assertEqual(metadata['title'], 'A JATS title')
+
+    def test_document_without_front(self):
+        self.assertIsNone(
+            jats.extract_front_metadata(io.BytesIO(b'<article><body/></article>')),
+        )
+
+
+class TestHarvest(TestCase):
+
+    issn = '1234-5678'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.journal, _journal_two = helpers.create_journals()
+
+    @staticmethod
+    def work(doi, deposited, broken=False, title=None):
+        item = benchmarks.synthetic_crossref_record(doi, authors=1)['message']
+        item['deposited'] = {'date-time': deposited}
+        if title is not None:
+            item['title'] = title
+        if broken:
+            item['author'][0]['affiliation'] = {'name': 'Not a list'}
+        return item
+
+    def harvest(self, pages, records=None):
+        fetched = []
+
+        def iter_journal_works(issn, from_update_date=None, rows=500):
+            return iter(pages)
+
+        def fetch_crossref_works(dois, workers=None):
+            fetched.extend(dois)
+            return [(doi, {'message': records[doi]}, None) for doi in dois]
+
+        with mock.patch.object(remote, 'iter_journal_works', iter_journal_works), \
+                mock.patch.object(remote, 'fetch_crossref_works', fetch_crossref_works):
+            totals = harvest.harvest_journal(self.journal, self.issn)
+        state = models.HarvestState.objects.get(journal=self.journal, issn=self.issn)
+        return totals, state, fetched
+
+    def test_failures_are_saved_without_holding_back_the_mark(self):
+        totals, state, _fetched = self.harvest([[
+            self.work('10.9999/harvest.1', '2020-01-01T00:00:00Z'),
+            self.work('10.9999/harvest.2', '2020-02-01T00:00:00Z', broken=True),
+            self.work('10.9999/harvest.3', '2020-03-01T00:00:00Z', title=[]),
+        ]])
+
+        self.assertEqual((totals['imported'], totals['failed']), (2, 1))
+        self.assertEqual(state.high_water_mark.isoformat(), '2020-03-01T00:00:00+00:00')
+        self.assertEqual(list(state.failed_dois), ['10.9999/harvest.2'])
+        self.assertEqual(state.failed_dois['10.9999/harvest.2']['attempts'], 1)
+
+    def test_failures_are_retried_until_imported(self):
+        broken = self.work('10.9999/retry.1', '2020-01-01T00:00:00Z', broken=True)
+        self.harvest([[broken]])
+
+        totals, state, fetched = self.harvest([], {'10.9999/retry.1': broken})
+        self.assertEqual(fetched, ['10.9999/retry.1'])
+        self.assertEqual(totals['retried'], 0)
+        self.assertEqual(state.failed_dois['10.9999/retry.1']['attempts'], 2)
+
+        fixed = self.work('10.9999/retry.1', '2020-01-01T00:00:00Z')
+        totals, state, fetched = self.harvest([], {'10.9999/retry.1': fixed})
+        self.assertEqual(totals['retried'], 1)
+        self.assertEqual(state.failed_dois, {})
+
+    def test_retries_stop_after_max_attempts(self):
+        broken = self.work('10.9999/stop.1', '2020-01-01T00:00:00Z', broken=True)
+        self.harvest([[broken]])
+        state = models.HarvestState.objects.get(journal=self.journal, issn=self.issn)
+        state.failed_dois['10.9999/stop.1']['attempts'] = harvest.HARVEST_MAX_ATTEMPTS
+        state.save()
+
+        totals, state, fetched = self.harvest([], {'10.9999/stop.1': broken})
+        self.assertEqual(fetched, [])
+        self.assertEqual(totals['failing'], 1)
+
+
+class TestDOIIndex(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.journal, cls.other_journal = helpers.create_journals()
+        cls.article = helpers.create_article(cls.journal)
+        ident_models.Identifier.objects.create(
+            id_type='doi',
+            identifier='https://doi.org/10.1234/Index.One',
+            article=cls.article,
+            enabled=True,
+        )
+
+    def test_key_ignores_case_and_resolver_prefixes(self):
+        for doi in ('10.1234/Index.One', ' https://dx.doi.org/10.1234/INDEX.one ',
+                    'doi:10.1234/index.one', 'http://doi.org/10.1234/index.ONE'):
+            self.assertEqual(logic.DOIIndex.key(doi), '10.1234/index.one')
+
+    def test_load_and_lookup_match_normalised_dois(self):
+        index = logic.DOIIndex(self.journal).load()
+        self.assertIn('10.1234/INDEX.ONE', index)
+        self.assertEqual(index.get('doi:10.1234/index.one'), self.article.pk)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                logic.DOIIndex.lookup(self.journal, 'http://dx.doi.org/10.1234/INDEX.one'),
+                self.article.pk,
+            )
+        self.assertIsNone(logic.DOIIndex.lookup(self.other_journal, '10.1234/index.one'))
+        self.assertIsNone(logic.DOIIndex.lookup(self.journal, '10.1234/index.two'))
+
+    def test_import_skips_existing_dois_without_fetching(self):
+        fetched = []
+
+        def fetch_crossref_works(dois, workers=None):
+            fetched.extend(dois)
+            return [
+                (doi, benchmarks.synthetic_crossref_record(doi), None) for doi in dois
+            ]
+
+        with mock.patch.object(remote, 'fetch_crossref_works', fetch_crossref_works):
+            results = logic.import_dois(
+                ['10.1234/INDEX.ONE', '10.1234/index.new'],
+                self.journal,
+            )
+
+        self.assertEqual(fetched, ['10.1234/index.new'])
+        self.assertTrue(results[0]['skipped'])
+        self.assertEqual(results[0]['article'], self.article)
+        self.assertFalse(results[1]['skipped'])
@@ -0,0 +1,282 @@
+import mimetypes
+import os
+import posixpath
+import time
+import zipfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+
+from plugins.back_content import ledger, logic, metrics
+from submission import models as submission_models
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+ZIP_MAX_MEMBER_BYTES = getattr(
+    settings,
+    'BACK_CONTENT_ZIP_MAX_MEMBER_BYTES',
+    1024 * 1024 * 1024,
+)
+GALLEY_EXTENSIONS = {'.pdf', '.xml', '.html', '.htm', '.epub'}
+
+
+def saved_mime_type(saved, uploaded_file):
+    """
+    Reads the MIME type Janeway detected when it saved a file, falling back
+    to the upload's content type or extension.
+    """
+    mime_type = getattr(getattr(saved, 'file', None), 'mime_type', None)
+    return (
+        mime_type
+        or uploaded_file.content_type
+        or mimetypes.guess_type(uploaded_file.name)[0]
+        or 'application/octet-stream'
+    )
+
+
+def save_uploads(article, request, uploaded_files, label=None, is_galley=True):
+    """
+    Saves a set of uploaded galleys or supplementary files through the
+    production logic in a single transaction, timing each file.
+    :param article: Article object
+    :param request: HttpRequest
+    :param uploaded_files: list of Django UploadedFile objects
+    :param label: label for the galleys or supplementary files
+    :param is_galley: save as galleys when True, otherwise as
+    supplementary files
+    :return: list of per-file report dicts of name, size, mime_type,
+    save_time and the saved object
+    """
+    from production.logic import save_galley, save_supp_file
+
+    reports = []
+    with transaction.atomic():
+        for uploaded_file in uploaded_files:
+            start = time.perf_counter()
+            if is_galley:
+                saved = save_galley(
+                    article,
+                    request,
+                    uploaded_file,
+                    is_galley=True,
+                    label=label,
+                )
+            else:
+                saved = save_supp_file(
+                    article,
+                    request,
+                    uploaded_file,
+                    label,
+                )
+            report = {
+                'name': uploaded_file.name,
+                'size': uploaded_file.size or 0,
+                'mime_type': saved_mime_type(saved, uploaded_file),
+                'saved': saved,
+                'save_time': time.perf_counter() - start,
+            }
+            metrics.record(
+                'storage.save',
+                seconds=report['save_time'],
+                bytes_transferred=report['size'],
+            )
+            reports.append(report)
+
+    for report in reports:
+        logger.info(
+            'Saved {name} ({size} bytes, {mime_type}) for article {article} '
+            'in {save_time:.3f}s.'.format(article=article.pk, **report)
+        )
+    return reports
+
+
+def describe_reports(reports):
+    """
+    Summarises upload reports for a message to the editor.
+    """
+    return '{0} files ({1:.1f} MB) uploaded in {2:.2f}s.'.format(
+        len(reports),
+        sum(report['size'] for report in reports) / (1024 * 1024),
+        sum(report['save_time'] for report in reports),
+    )
+
+
+def group_zip_members(zip_file):
+    """
+    Groups the files in a ZIP archive by their top level folder, using the
+    archive's central directory so nothing is extracted.
+    :param zip_file: zipfile.ZipFile
+    :return: dict of folder name to list of ZipInfo objects
+    """
+    folders = {}
+    for info in zip_file.infolist():
+        if info.is_dir():
+            continue
+        parts = posixpath.normpath(info.filename).split('/')
+        if len(parts) < 2 or '..' in parts or parts[0] == '__MACOSX':
+            continue
+        if parts[-1].startswith('.'):
+            continue
+        folders.setdefault(parts[0], []).append(info)
+    return folders
+
+
+def match_folders(journal, folders):
+    """
+    Matches folder names to the journal's articles by article ID or by DOI,
+    with the DOI's slash replaced by an underscore in the folder name. DOIs
+    are compared the way DOIIndex compares them, ignoring case and resolver
+    prefixes.
+    :param journal: Journal object
+    :param folders: list of folder names
+    :return: dict of folder name to Article
+    """
+    ids = {int(folder) for folder in folders if folder.isdigit()}
+    by_id = submission_models.Article.objects.filter(
+        journal=journal,
+        pk__in=ids,
+    ).in_bulk()
+
+    by_doi = {}
+    doi_folders = [folder for folder in folders if not folder.isdigit()]
+    if doi_folders:
+        doi_index = logic.DOIIndex(journal).load()
+        article_ids = {}
+        for folder in doi_folders:
+            article_id = doi_index.get(folder.replace('_', '/', 1)) or doi_index.get(folder)
+            if article_id:
+                article_ids[folder] = article_id
+        articles = submission_models.Article.objects.in_bulk(set(article_ids.values()))
+        by_doi = {
+            folder: articles[article_id] for folder, article_id in article_ids.items()
+            if article_id in articles
+        }
+
+    matched = {}
+    for folder in folders:
+        if folder.isdigit() and int(folder) in by_id:
+            matched[folder] = by_id[int(folder)]
+        elif folder in by_doi:
+            matched[folder] = by_doi[folder]
+    return matched
+
+
+def zip_member_upload(zip_file, info):
+    """
+    Wraps an archive member as an UploadedFile that is decompressed as it
+    is read.
+    """
+    return UploadedFile(
+        file=zip_file.open(info),
+        name=posixpath.basename(info.filename),
+        content_type=mimetypes.guess_type(info.filename)[0],
+        size=info.file_size,
+    )
+
+
+def zip_member_key(info):
+    """
+    Identifies an archive member by its path, CRC-32 and size, all read
+    from the central directory.
+    """
+    return 'zip:{0}:{1:08x}:{2}'.format(info.filename, info.CRC, info.file_size)
+
+
+def ingest_zip(archive, request, label=None):
+    """
+    Attaches the files in a ZIP archive to articles, one folder per article.
+    PDF, XML, HTML and EPUB files become galleys and everything else is
+    saved as a supplementary file, and an article with an XML galley is
+    prefilled from its JATS front matter. Saved members are recorded in a ledger
+    keyed on the archive's contents, so uploading the same archive again
+    after a failure only saves the members that are missing.
+    :param archive: path or file object of the ZIP archive
+    :param request: HttpRequest
+    :param label: label for the galleys and supplementary files
+    :return: dict of matched folder results and unmatched, skipped and
+    already imported names
+    """
+    from plugins.back_content import jats
+
+    results = []
+    skipped = []
+    already_imported = []
+    with zipfile.ZipFile(archive) as zip_file:
+        folders = group_zip_members(zip_file)
+        matched = match_folders(request.journal, list(folders))
+        batch_ledger = ledger.Ledger(
+            request.journal,
+            ledger.batch_key(
+                request.journal,
+                'zip',
+                [zip_member_key(info) for info in zip_file.infolist()],
+            ),
+        ).load()
+
+        for folder, members in sorted(folders.items()):
+            article = matched.get(folder)
+            if not article:
+                continue
+
+            galleys = []
+            supp_files = []
+            for info in members:
+                if info.file_size > ZIP_MAX_MEMBER_BYTES:
+                    skipped.append(info.filename)
+                    continue
+                if batch_ledger.is_complete(zip_member_key(info)):
+                    already_imported.append(info.filename)
+                    continue
+                extension = os.path.splitext(info.filename)[1].lower()
+                if extension in GALLEY_EXTENSIONS:
+                    galleys.append(info)
+                else:
+                    supp_files.append(info)
+
+            if not galleys and not supp_files:
+                continue
+
+            result = {
+                'folder': folder,
+                'article': article,
+                'reports': [],
+                'prefilled': [],
+                'error': None,
+            }
+            try:
+                with transaction.atomic():
+                    for infos, is_galley in ((galleys, True), (supp_files, False)):
+                        uploaded_files = [zip_member_upload(zip_file, info) for info in infos]
+                        try:
+                            result['reports'].extend(
+                                save_uploads(
+                                    article,
+                                    request,
+                                    uploaded_files,
+                                    label=label,
+                                    is_galley=is_galley,
+                                )
+                            )
+                        finally:
+                            for uploaded_file in uploaded_files:
+                                uploaded_file.close()
+                        for info in infos:
+                            batch_ledger.record(zip_member_key(info), article)
+                    xml_galleys = [
+                        report['saved'] for report in result['reports']
+                        if report['saved'] and report['mime_type'].endswith('/xml')
+                    ]
+                    if xml_galleys:
+                        result['prefilled'] = jats.prefill_from_galley(article, xml_galleys[0])
+            except Exception as e:
+                result['error'] = '{0}: {1}'.format(type(e).__name__, e)
+            results.append(result)
+
+    return {
+        'results': results,
+        'unmatched': sorted(set(folders) - set(matched)),
+        'skipped': skipped,
+        'already_imported': already_imported,
+    }
@@ -6,13 +6,24 @@ from journal.views import article_figure
 
 urlpatterns = [
     re_path(r'^$', views.index, name='bc_index'),
+    re_path(r'^articles/$', views.index_data, name='bc_index_data'),
+    re_path(r'^metrics/$', views.metrics_export, name='bc_metrics'),
+    re_path(r'^jobs/(?P<job_id>\d+)/$', views.job, name='bc_job'),
+    re_path(r'^jobs/(?P<job_id>\d+)/status/$', views.job_status, name='bc_job_status'),
     re_path(r'^article/create/$', views.create_article, name='bc_create_article'),
     re_path(r'^article/(?P<article_id>\d+)/edit/$', views.edit_article, name='bc_edit_article'),
     re_path(r'^article/(?P<article_id>\d+)/authors/$', views.add_authors, name='bc_add_authors'),
     re_path(r'^article/(?P<article_id>\d+)/galleys/$', views.add_galleys, name='bc_add_galleys'),
     re_path(r'^article/(?P<article_id>\d+)/publish/$', views.publish, name='bc_publish_article'),
 
+    re_path(r'^publish/$', views.bulk_publish, name='bc_bulk_publish'),
+
     re_path(r'^doi_import/$', views.doi_import, name='bc_doi_import'),
+    re_path(r'^doi_import/batch/$', views.batch_doi_import, name='bc_batch_doi_import'),
+    re_path(r'^doi_import/async/$', views.doi_import_async, name='bc_doi_import_async'),
+    re_path(r'^doi_import/batch/async/$', views.batch_doi_import_async, name='bc_batch_doi_import_async'),
+    re_path(r'^zip_import/$', views.zip_import, name='bc_zip_import'),
+    re_path(r'^spreadsheet_import/$', views.spreadsheet_import, name='bc_spreadsheet_import'),
 
     re_path(r'^article/(?P<article_id>\d+)/galley/(?P<galley_id>\d+)/$', views.preview_xml_galley,
         name='bc_preview_xml_galley'),
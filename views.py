@@ -1,10 +1,10 @@
-import requests
+from asgiref.sync import sync_to_async
 
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
 from django.contrib import messages
 from django.utils import timezone
-from django.http import Http404
+from django.http import Http404, HttpResponse, JsonResponse
 from django.utils.translation import gettext_lazy as _
 
 from security.decorators import editor_user_required
@@ -17,46 +17,79 @@ from submission.models import (Article,
                                FrozenAuthor,
                                STAGE_PUBLISHED)
 from submission.forms import FileDetails, EditFrozenAuthor
-from submission.logic import add_new_author_from_form, get_credit_form
+from submission.logic import add_new_author_from_form
 
 from production.forms import GalleyForm
-from production.logic import (save_galley,
-                              get_all_galleys,
-                              save_supp_file)
-
-from journal.logic import get_galley_content
 
 from plugins.back_content.forms import (ArticleInfo,
                                         PublicationInfo,
                                         DepositAgreementForm,
-                                        RemoteParse)
+                                        RemoteParse,
+                                        BatchDOIImport,
+                                        BulkPublish,
+                                        SpreadsheetImport,
+                                        ZipImport,
+                                        credit_forms)
 from plugins.back_content.logic import (get_and_parse_doi_metadata,
-                                        parse_url_results)
-
-from identifiers.logic import generate_crossref_doi_with_pattern
-from events.logic import Events
+                                        parse_url_results,
+                                        import_dois,
+                                        completed_results,
+                                        save_doi_records,
+                                        AuthorIndex,
+                                        DOIIndex,
+                                        bulk_publish as publish_articles,
+                                        unpublished_articles_page,
+                                        available_authors,
+                                        substring_author_search,
+                                        load_authors_and_credits)
+
+from plugins.back_content import (async_remote,
+                                  jobs,
+                                  journal_cache,
+                                  ledger,
+                                  metrics,
+                                  models,
+                                  previews,
+                                  remote,
+                                  spreadsheet,
+                                  uploads)
 
 @editor_user_required
 def index(request):
-    articles = Article.objects.filter(
-        journal=request.journal,
-    ).exclude(
-        stage=STAGE_PUBLISHED
-    ).select_related(
-        'correspondence_author',
-        'section',
-    )
-
     template = 'back_content/index.html'
     context = {
-        'articles': articles,
+        'jobs': models.ImportJob.objects.filter(
+            journal=request.journal,
+        )[:10],
     }
 
     return render(request, template, context)
 
+@editor_user_required
+def index_data(request):
+    try:
+        limit = min(int(request.GET.get('limit', 25)), 100)
+    except ValueError:
+        limit = 25
+
+    rows, next_cursor = unpublished_articles_page(
+        request.journal,
+        search=request.GET.get('q', '').strip(),
+        sort=request.GET.get('sort', '-id'),
+        cursor=request.GET.get('cursor'),
+        limit=max(limit, 1),
+    )
+    for row in rows:
+        row['url'] = reverse('bc_edit_article', kwargs={'article_id': row['id']})
+
+    return JsonResponse({
+        'results': rows,
+        'next': next_cursor,
+    })
+
 @editor_user_required
 def create_article(request):
-    additional_fields = request.journal.field_set.all()
+    additional_fields = journal_cache.get_journal_config(request.journal)['fields']
     if request.method == 'POST':
         article_form = ArticleInfo(request.POST,
                                    additional_fields=additional_fields,
@@ -90,7 +123,7 @@ def edit_article(request, article_id):
         journal=request.journal,
     )
 
-    additional_fields = request.journal.field_set.all()
+    additional_fields = journal_cache.get_journal_config(request.journal)['fields']
     if request.method == 'POST':
         article_form = ArticleInfo(request.POST,
                                    additional_fields=additional_fields,
@@ -165,10 +198,7 @@ def add_authors(request, article_id):
             else:
                 return redirect(reverse('bc_index'))
 
-    authors = []
-    for author, credits in article.authors_and_credits().items():
-        credit_form = get_credit_form(request, author)
-        authors.append((author, credits, credit_form))
+    authors = credit_forms(load_authors_and_credits(article))
 
     context = {
         'article': article,
@@ -180,7 +210,11 @@ def add_authors(request, article_id):
 
 
 @editor_user_required
+@metrics.instrument_view('add_galleys')
 def add_galleys(request, article_id):
+    from production import logic as production_logic
+    from plugins.back_content import jats
+
     article = get_object_or_404(
         Article,
         pk=article_id,
@@ -192,24 +226,41 @@ def add_galleys(request, article_id):
     if request.method == "POST":
         if "supp-file" in request.FILES:
             label = request.POST.get('label')
-            for uploaded_file in request.FILES.getlist('supp-file'):
-                save_supp_file(
-                    article,
-                    request,
-                    uploaded_file,
-                    label
-                )
+            reports = uploads.save_uploads(
+                article,
+                request,
+                request.FILES.getlist('supp-file'),
+                label=label,
+                is_galley=False,
+            )
+            messages.success(request, uploads.describe_reports(reports))
             return redirect(reverse('bc_add_galleys', kwargs={"article_id": article.pk}))
         elif "file" in request.FILES:
             label = request.POST.get('label')
-            for uploaded_file in request.FILES.getlist('file'):
-                save_galley(
-                    article,
-                    request,
-                    uploaded_file,
-                    is_galley=True,
-                    label=label,
+            reports = uploads.save_uploads(
+                article,
+                request,
+                request.FILES.getlist('file'),
+                label=label,
+            )
+            xml_galleys = [
+                report['saved'] for report in reports
+                if report['saved'] and previews.is_xml_galley(report['saved'])
+            ]
+            if xml_galleys:
+                jobs.enqueue(
+                    'preview',
+                    request.journal,
+                    request.user,
+                    [galley.pk for galley in xml_galleys],
                 )
+                filled = jats.prefill_from_galley(article, xml_galleys[0])
+                if filled:
+                    messages.info(
+                        request,
+                        'Filled in {0} from the XML galley.'.format(', '.join(filled)),
+                    )
+            messages.success(request, uploads.describe_reports(reports))
             return redirect(reverse('bc_add_galleys', kwargs={"article_id": article.pk}))
         elif "continue" in request.POST:
             return redirect(reverse('bc_publish_article', kwargs={"article_id": article.pk}))
@@ -220,7 +271,7 @@ def add_galleys(request, article_id):
 
     context = {
         "article": article,
-        'galleys': get_all_galleys(article),
+        'galleys': production_logic.get_all_galleys(article),
         "galley_form": galley_form,
         "supp_form": supp_form
     }
@@ -228,7 +279,11 @@ def add_galleys(request, article_id):
 
 
 @editor_user_required
+@metrics.instrument_view('publish')
 def publish(request, article_id):
+    from identifiers.logic import generate_crossref_doi_with_pattern
+    from events.logic import Events
+
     article = get_object_or_404(
         Article,
         pk=article_id,
@@ -265,11 +320,12 @@ def publish(request, article_id):
                     article.save()
                     kwargs = {'article': article,
                               'request': request}
-                    Events.raise_event(
-                        Events.ON_ARTICLE_PUBLISHED,
-                        task_object=article,
-                        **kwargs,
-                    )
+                    with metrics.stage('events'):
+                        Events.raise_event(
+                            Events.ON_ARTICLE_PUBLISHED,
+                            task_object=article,
+                            **kwargs,
+                        )
                     messages.add_message(
                         request,
                         messages.SUCCESS,
@@ -290,6 +346,35 @@ def publish(request, article_id):
     return render(request, template, context)
 
 @editor_user_required
+@metrics.instrument_view('bulk_publish')
+def bulk_publish(request):
+    form = BulkPublish(journal=request.journal)
+    result = None
+
+    if request.POST:
+        form = BulkPublish(request.POST, journal=request.journal)
+        if form.is_valid():
+            articles, issue = form.get_articles()
+            result = publish_articles(articles, request, issue=issue)
+            messages.add_message(
+                request,
+                messages.SUCCESS,
+                _('{0} articles published, {1} skipped.').format(
+                    len(result['published']),
+                    len(result['skipped']),
+                ),
+            )
+
+    template = 'back_content/bulk_publish.html'
+    context = {
+        'form': form,
+        'result': result,
+    }
+
+    return render(request, template, context)
+
+@editor_user_required
+@metrics.instrument_view('doi_import')
 def doi_import(request):
     form = RemoteParse()
 
@@ -299,12 +384,20 @@ def doi_import(request):
             url = form.cleaned_data['url']
             mode = form.cleaned_data['mode']
 
+            if form.cleaned_data['background']:
+                job = jobs.enqueue(mode, request.journal, request.user, [url])
+                return redirect(reverse('bc_job', kwargs={'job_id': job.pk}))
+
             if mode == 'doi':
-                r = requests.get('https://api.crossref.org/v1/works/{0}'.format(url)).json()
+                existing = DOIIndex.lookup(request.journal, url)
+                if existing:
+                    messages.info(request, 'An article with this DOI already exists.')
+                    return redirect(reverse('bc_edit_article', kwargs={'article_id': existing}))
+                r = remote.fetch_crossref_work(url)
                 article = get_and_parse_doi_metadata(r, request, doi=url)
                 return redirect(reverse('bc_edit_article', kwargs={'article_id': article.pk}))
             else:
-                r = requests.get(url)
+                r = remote.fetch_url(url)
                 article = parse_url_results(r, request)
                 return redirect(reverse('bc_edit_article', kwargs={'article_id': article.pk}))
 
@@ -316,6 +409,293 @@ def doi_import(request):
     return render(request, template, context)
 
 @editor_user_required
+@metrics.instrument_view('batch_doi_import')
+def batch_doi_import(request):
+    form = BatchDOIImport()
+    results = None
+
+    if request.POST:
+        form = BatchDOIImport(request.POST, request.FILES)
+        if form.is_valid() and form.cleaned_data['background']:
+            job = jobs.enqueue(
+                'doi',
+                request.journal,
+                request.user,
+                form.cleaned_data['doi_list'],
+            )
+            return redirect(reverse('bc_job', kwargs={'job_id': job.pk}))
+        elif form.is_valid():
+            cache_stats = dict(remote.response_cache.stats)
+            doi_list = form.cleaned_data['doi_list']
+            results = import_dois(
+                doi_list,
+                request.journal,
+                ledger=ledger.Ledger(
+                    request.journal,
+                    ledger.batch_key(request.journal, 'doi', doi_list),
+                ).load(),
+            )
+            failed = len([result for result in results if result['error']])
+            skipped = len([result for result in results if result['skipped']])
+            messages.add_message(
+                request,
+                messages.SUCCESS if not failed else messages.WARNING,
+                '{0} articles imported, {1} already imported, {2} failed. '
+                '{3} records were served from the cache.'.format(
+                    len(results) - failed - skipped,
+                    skipped,
+                    failed,
+                    remote.response_cache.stats['hits'] - cache_stats['hits'] +
+                    remote.response_cache.stats['revalidated'] - cache_stats['revalidated'],
+                ),
+            )
+
+    template = 'back_content/batch_doi_import.html'
+    context = {
+        'form': form,
+        'results': results,
+    }
+
+    return render(request, template, context)
+
+async def editor_check(request):
+    """
+    Runs the editor_user_required check for an async view.
+    :return: None when the user may continue, otherwise the response the
+    decorator returned
+    """
+    return await sync_to_async(editor_user_required(lambda request: None))(request)
+
+@metrics.instrument_view('doi_import_async')
+async def doi_import_async(request):
+    """
+    Async version of doi_import. The remote fetch doesn't hold a worker
+    thread, only the ORM work runs in one.
+    """
+    denied = await editor_check(request)
+    if denied:
+        return denied
+
+    form = RemoteParse()
+
+    if request.POST:
+        form = RemoteParse(request.POST)
+        if form.is_valid():
+            url = form.cleaned_data['url']
+            mode = form.cleaned_data['mode']
+
+            if form.cleaned_data['background']:
+                job = await sync_to_async(jobs.enqueue)(
+                    mode,
+                    request.journal,
+                    request.user,
+                    [url],
+                )
+                return redirect(reverse('bc_job', kwargs={'job_id': job.pk}))
+
+            if mode == 'doi':
+                existing = await sync_to_async(DOIIndex.lookup)(request.journal, url)
+                if existing:
+                    messages.info(request, 'An article with this DOI already exists.')
+                    return redirect(reverse('bc_edit_article', kwargs={'article_id': existing}))
+                fetcher, save = async_remote.fetch_crossref_work, get_and_parse_doi_metadata
+                kwargs = {'doi': url}
+            else:
+                fetcher, save = async_remote.fetch_url, parse_url_results
+                kwargs = {}
+
+            _url, r, error = (await async_remote.gather_fetches(fetcher, [url]))[0]
+            if error:
+                raise error
+            article = await sync_to_async(save)(r, request, **kwargs)
+            return redirect(reverse('bc_edit_article', kwargs={'article_id': article.pk}))
+
+    template = 'back_content/doi_import.html'
+    context = {
+        'form': form,
+    }
+
+    return await sync_to_async(render)(request, template, context)
+
+@metrics.instrument_view('batch_doi_import_async')
+async def batch_doi_import_async(request):
+    """
+    Async version of batch_doi_import. Records are fetched concurrently and
+    saved in chunks of jobs.JOB_CHUNK_SIZE, one thread call per chunk.
+    """
+    denied = await editor_check(request)
+    if denied:
+        return denied
+
+    form = BatchDOIImport()
+    results = None
+
+    if request.POST:
+        form = BatchDOIImport(request.POST, request.FILES)
+        if form.is_valid() and form.cleaned_data['background']:
+            job = await sync_to_async(jobs.enqueue)(
+                'doi',
+                request.journal,
+                request.user,
+                form.cleaned_data['doi_list'],
+            )
+            return redirect(reverse('bc_job', kwargs={'job_id': job.pk}))
+        elif form.is_valid():
+            doi_list = form.cleaned_data['doi_list']
+            batch_ledger = await sync_to_async(
+                ledger.Ledger(
+                    request.journal,
+                    ledger.batch_key(request.journal, 'doi', doi_list),
+                ).load
+            )()
+            doi_index = await sync_to_async(DOIIndex(request.journal).load)()
+            completed = completed_results(doi_list, 'doi', batch_ledger)
+            completed.update(
+                await sync_to_async(doi_index.existing_results)(
+                    [doi for doi in doi_list if doi not in completed],
+                )
+            )
+            fetched = await async_remote.gather_fetches(
+                async_remote.fetch_crossref_work,
+                [doi for doi in doi_list if doi not in completed],
+            )
+
+            author_index = AuthorIndex()
+            saved = {}
+            for i in range(0, len(fetched), jobs.JOB_CHUNK_SIZE):
+                chunk_results = await sync_to_async(save_doi_records)(
+                    fetched[i:i + jobs.JOB_CHUNK_SIZE],
+                    request.journal,
+                    author_index,
+                    batch_ledger,
+                    doi_index,
+                )
+                saved.update((result['doi'], result) for result in chunk_results)
+            results = [completed.get(doi) or saved[doi] for doi in doi_list]
+
+            failed = len([result for result in results if result['error']])
+            messages.add_message(
+                request,
+                messages.SUCCESS if not failed else messages.WARNING,
+                '{0} articles imported, {1} already imported, {2} failed.'.format(
+                    len(results) - failed - len(completed),
+                    len(completed),
+                    failed,
+                ),
+            )
+
+    template = 'back_content/batch_doi_import.html'
+    context = {
+        'form': form,
+        'results': results,
+    }
+
+    return await sync_to_async(render)(request, template, context)
+
+@editor_user_required
+@metrics.instrument_view('spreadsheet_import')
+def spreadsheet_import(request):
+    form = SpreadsheetImport()
+    importer = None
+
+    if request.POST:
+        form = SpreadsheetImport(request.POST, request.FILES)
+        if form.is_valid():
+            importer = spreadsheet.import_spreadsheet(
+                form.cleaned_data['spreadsheet'],
+                request.journal,
+                request.user,
+            )
+            messages.add_message(
+                request,
+                messages.SUCCESS if not importer.error_count else messages.WARNING,
+                '{0} articles created, {1} rows had errors.'.format(
+                    importer.created,
+                    importer.error_count,
+                ),
+            )
+
+    template = 'back_content/spreadsheet_import.html'
+    context = {
+        'form': form,
+        'importer': importer,
+    }
+
+    return render(request, template, context)
+
+@editor_user_required
+@metrics.instrument_view('zip_import')
+def zip_import(request):
+    form = ZipImport()
+    result = None
+
+    if request.POST:
+        form = ZipImport(request.POST, request.FILES)
+        if form.is_valid():
+            archive = form.cleaned_data['archive']
+            if hasattr(archive, 'temporary_file_path'):
+                archive = archive.temporary_file_path()
+            result = uploads.ingest_zip(
+                archive,
+                request,
+                label=form.cleaned_data['label'] or None,
+            )
+            messages.add_message(
+                request,
+                messages.SUCCESS,
+                '{0} folders matched to articles, {1} unmatched.'.format(
+                    len(result['results']),
+                    len(result['unmatched']),
+                ),
+            )
+
+    template = 'back_content/zip_import.html'
+    context = {
+        'form': form,
+        'result': result,
+    }
+
+    return render(request, template, context)
+
+@editor_user_required
+def job(request, job_id):
+    import_job = get_object_or_404(
+        models.ImportJob,
+        pk=job_id,
+        journal=request.journal,
+    )
+
+    template = 'back_content/job.html'
+    context = {
+        'job': import_job,
+    }
+
+    return render(request, template, context)
+
+@editor_user_required
+def job_status(request, job_id):
+    import_job = get_object_or_404(
+        models.ImportJob,
+        pk=job_id,
+        journal=request.journal,
+    )
+    return JsonResponse(import_job.as_dict())
+
+@editor_user_required
+def metrics_export(request):
+    """
+    Returns the import metrics collected by this worker process in the
+    Prometheus text format.
+    :param request: HttpRequest
+    :return: HttpResponse
+    """
+    return HttpResponse(
+        metrics.prometheus_text(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+@editor_user_required
+@metrics.instrument_view('preview_xml_galley')
 def preview_xml_galley(request, article_id, galley_id):
     """
     Allows an editor to preview an article's XML galleys.
@@ -326,12 +706,19 @@ def preview_xml_galley(request, article_id, galley_id):
     """
 
     article = get_object_or_404(Article, journal=request.journal, pk=article_id)
-    galley = Galley.objects.filter(article=article, file__mime_type__contains='/xml', pk=galley_id)
+    galley = Galley.objects.filter(
+        article=article,
+        file__mime_type__contains='/xml',
+        pk=galley_id,
+    ).select_related(
+        'file',
+        'xsl_file',
+    )
 
     if not galley:
         raise Http404
 
-    content = get_galley_content(article, galley)
+    content = previews.render_preview(article, galley)
 
     template = 'journal/article.html'
     context = {
@@ -359,7 +746,9 @@ class BCPAuthorSearch(BaseUserList):
         facets = {
             'q': {
                 'type': 'search',
-                'field_label': 'Search',
+                'field_label': _('Search') if substring_author_search() else _(
+                    'Search (matches the start of names and emails)'
+                ),
             },
             'is_active': {
                 'type': 'boolean',
@@ -379,11 +768,15 @@ class BCPAuthorSearch(BaseUserList):
         ]
 
     def get_queryset(self, params_querydict=None):
-        return super().get_queryset().exclude(
-            pk__in=self.article.authors.all().values_list(
-                'pk',
-                flat=True,
-            ),
+        # BaseUserList's own q search is replaced rather than combined, so
+        # it is blanked before the other facets are applied.
+        params = (params_querydict or self.request.GET).copy()
+        term = params.get('q', '')
+        params['q'] = ''
+        return available_authors(
+            super().get_queryset(params_querydict=params),
+            self.article,
+            term,
         )
 
     def get_context_data(self, **kwargs):
@@ -398,7 +791,7 @@ class BCPAuthorSearch(BaseUserList):
                 Account,
                 pk=author_id,
             )
-            if author in self.get_queryset():
+            if self.get_queryset().filter(pk=author.pk).exists():
                 author, _created = FrozenAuthor.get_or_snapshot_if_email_found(
                     author.email,
                     self.article,